@@ -0,0 +1,84 @@
+"""Compare les deux modes de GoogleMapsScraper.extract_reviews sur des pages HTML enregistrées.
+
+- "script"   : toutes les cartes lues en un seul execute_script
+- "elements" : find_elements / find_element pour chaque avis (ancien chemin)
+
+Par défaut, des pages figées de 50, 200 et 500 avis sont générées dans
+benchmarks/fixtures/ ; on peut aussi passer des pages enregistrées depuis
+Chrome ("Enregistrer sous") après défilement des avis.
+
+Usage: python benchmarks/bench_extract_reviews.py [page.html ...]
+"""
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, "extract"))
+
+from google_maps_scraper import GoogleMapsScraper  # noqa: E402
+from fixture_server import render_reviews_snapshot  # noqa: E402
+
+FIXTURE_DIR = os.path.join(HERE, "fixtures")
+DEFAULT_SIZES = [50, 200, 500]
+
+
+def default_fixtures():
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    paths = []
+    for n in DEFAULT_SIZES:
+        path = os.path.join(FIXTURE_DIR, f"reviews_{n}.html")
+        if not os.path.exists(path):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(render_reviews_snapshot(n))
+        paths.append(path)
+    return paths
+
+
+def count_commands(driver):
+    """Compte les commandes WebDriver envoyées au navigateur."""
+    counter = {"calls": 0}
+    execute = driver.execute
+
+    def counting_execute(*args, **kwargs):
+        counter["calls"] += 1
+        return execute(*args, **kwargs)
+
+    driver.execute = counting_execute
+    return counter
+
+
+def run(scraper, counter, mode, target):
+    counter["calls"] = 0
+    start = time.perf_counter()
+    if mode == "script":
+        reviews = scraper.extract_reviews_script(target)
+    else:
+        reviews = scraper.extract_reviews_elements(target)
+    return reviews, time.perf_counter() - start, counter["calls"]
+
+
+def main(paths):
+    # Pas d'attente implicite : l'ancien chemin attendrait sur chaque élément absent
+    scraper = GoogleMapsScraper(implicit_wait=0, explicit_wait=5)
+    counter = count_commands(scraper.driver)
+    try:
+        print(f"{'page':<24}{'mode':<10}{'avis':>6}{'temps (s)':>12}{'appels WD':>12}{'avis/s':>10}")
+        for path in paths:
+            scraper.driver.get("file://" + os.path.abspath(path))
+            target = 10 ** 6
+            baseline = None
+            for mode in ("elements", "script"):
+                reviews, elapsed, calls = run(scraper, counter, mode, target)
+                print(f"{os.path.basename(path):<24}{mode:<10}{len(reviews):>6}{elapsed:>12.3f}"
+                      f"{calls:>12}{len(reviews) / elapsed if elapsed else 0:>10.0f}")
+                if baseline is None:
+                    baseline = reviews
+                elif reviews != baseline:
+                    print("  ! les deux modes ne renvoient pas les mêmes avis")
+    finally:
+        scraper.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or default_fixtures())
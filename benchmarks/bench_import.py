@@ -0,0 +1,51 @@
+"""Mesure le temps d'import de transform/subject_analysis.py.
+
+Chaque mesure est faite dans un nouveau processus Python (import à froid) et
+vérifie qu'aucun modèle lourd (torch, transformers, spaCy, sklearn) n'est
+chargé à l'import.
+
+Usage: python benchmarks/bench_import.py [nombre_de_mesures]
+"""
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+TRANSFORM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "transform")
+HEAVY_MODULES = ["torch", "transformers", "spacy", "sklearn"]
+
+CHILD = f"""
+import sys, time, json
+start = time.perf_counter()
+import subject_analysis
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "ms": elapsed * 1000,
+    "heavy": [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+}}))
+"""
+
+
+def measure_once():
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(TRANSFORM_DIR))
+    out = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(runs=5):
+    results = [measure_once() for _ in range(runs)]
+    timings = [r["ms"] for r in results]
+    heavy = sorted({m for r in results for m in r["heavy"]})
+
+    print(f"import subject_analysis ({runs} runs): "
+          f"median {statistics.median(timings):.1f} ms, min {min(timings):.1f} ms, max {max(timings):.1f} ms")
+    if heavy:
+        print(f"Modules lourds chargés à l'import: {heavy}")
+        return 1
+    print("Aucun modèle chargé à l'import")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
@@ -0,0 +1,117 @@
+"""Mémoire du DataFrame des avis : colonnes object (ancien format) contre REVIEW_SCHEMA.
+
+Construit un corpus synthétique (adresses et villes répétées sur ~107
+agences, trois sentiments, un topic par avis) bloc par bloc comme
+iter_review_chunks, le concatène, ajoute les colonnes d'analyse, puis
+mesure la taille du DataFrame et le pic de mémoire du processus. Chaque
+mode tourne dans un sous-processus pour que les pics ne se mélangent pas.
+
+Usage: python benchmarks/bench_review_memory.py [n_avis]
+"""
+import os
+import sys
+import json
+import random
+import resource
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, "transform"))
+
+N_AGENCIES = 107
+CHUNK_SIZE = 5000
+
+
+def synthetic_rows(n_reviews, seed=0):
+    from fixture_server import CITIES, WORDS, DATES
+
+    rng = random.Random(seed)
+    addresses = [(f"{10 + i} Bd Mohammed V, {CITIES[i % len(CITIES)]} {20000 + i}", CITIES[i % len(CITIES)])
+                 for i in range(N_AGENCIES)]
+    for k in range(n_reviews):
+        address, city = addresses[rng.randrange(N_AGENCIES)]
+        yield {
+            "place_address": address,
+            "user_name": f"Client {k}",
+            "text": " ".join(rng.choice(WORDS) for _ in range(rng.choice([0, 6, 15, 40]))),
+            "date": rng.choice(DATES),
+            "city": city,
+            "scraped_at": "2026-01-01T00:00:00"
+        }
+
+
+def build(n_reviews, typed):
+    from subject_analysis import REVIEW_COLUMNS, apply_review_schema
+
+    chunks = []
+    rows = []
+    for row in synthetic_rows(n_reviews):
+        rows.append(row)
+        if len(rows) == CHUNK_SIZE:
+            chunks.append(pd.DataFrame(rows, columns=REVIEW_COLUMNS))
+            if typed:
+                apply_review_schema(chunks[-1])
+            rows = []
+    if rows:
+        chunks.append(pd.DataFrame(rows, columns=REVIEW_COLUMNS))
+        if typed:
+            apply_review_schema(chunks[-1])
+    df = pd.concat(chunks, ignore_index=True)
+    del chunks
+
+    rng = np.random.default_rng(0)
+    sentiment = pd.Series(rng.choice(["NEGATIVE", "NEUTRAL", "POSITIVE"], len(df)), index=df.index)
+    proba = pd.Series(rng.random(len(df)), index=df.index)
+    topic = rng.integers(1, 11, len(df))
+    if typed:
+        apply_review_schema(df)
+        df["sentiment"] = sentiment
+        df["sentiment_proba"] = proba
+        df["topic_id"] = topic
+        apply_review_schema(df, ["sentiment", "sentiment_proba", "topic_id"])
+    else:
+        # Ancien format : nouvelle copie du DataFrame à l'ajout du sentiment, un dict de topic par avis
+        df = pd.concat([df, pd.DataFrame({"sentiment": sentiment, "sentiment_proba": proba})], axis=1)
+        words = {i: [f"mot{j}" for j in range(10)] for i in range(1, 11)}
+        df["topics"] = [{f"Sujet {t}": words[t]} for t in topic]
+    return df
+
+
+def measure(n_reviews, mode):
+    df = build(n_reviews, typed=(mode == "typed"))
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "mode": mode,
+        "frame_mb": df.memory_usage(deep=True).sum() / 2 ** 20,
+        "peak_rss_mb": peak_kb / 1024,
+        "dtypes": {c: str(t) for c, t in df.dtypes.items()}
+    }))
+
+
+def main(n_reviews):
+    reports = []
+    for mode in ("object", "typed"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--measure", mode, str(n_reviews)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        reports.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{n_reviews} avis")
+    print(f"{'mode':<8}{'DataFrame (Mo)':>16}{'pic RSS (Mo)':>14}")
+    for report in reports:
+        print(f"{report['mode']:<8}{report['frame_mb']:>16.1f}{report['peak_rss_mb']:>14.1f}")
+    before, after = reports
+    print(f"gain : DataFrame x{before['frame_mb'] / after['frame_mb']:.1f}, "
+          f"pic RSS -{before['peak_rss_mb'] - after['peak_rss_mb']:.0f} Mo")
+    print("types:", reports[1]["dtypes"])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--measure":
+        measure(int(sys.argv[3]), sys.argv[2])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
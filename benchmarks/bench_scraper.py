@@ -0,0 +1,133 @@
+"""Banc d'essai du scraper sur le serveur local de pages factices (sans Google Maps).
+
+Enchaîne les étapes du scraper comme en production : search_places,
+extract_agency_links, puis pour chaque agence get_place_details,
+click_on_reviews, chargement des avis (scroll_reviews + expand_reviews, ou le
+défilement dans la page) et extract_reviews. Affiche le temps et les appels
+WebDriver par étape, puis agences/min, avis/s et appels WebDriver par avis.
+
+À lancer après chaque changement de sélecteurs ou de logique d'attente : le
+code de sortie est 1 si des avis manquent par rapport aux pages servies.
+
+Usage:
+    python benchmarks/bench_scraper.py [--agencies 6] [--reviews 40] [--delay-ms 300]
+                                       [--mode python|in-page|both] [--json rapport.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, "extract"))
+
+from google_maps_scraper import GoogleMapsScraper, Pacer  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+from bench_extract_reviews import count_commands  # noqa: E402
+
+
+class StepMeter:
+    """Temps et appels WebDriver cumulés par étape."""
+
+    def __init__(self, counter):
+        self.counter = counter
+        self.steps = defaultdict(lambda: {"seconds": 0.0, "calls": 0, "runs": 0})
+
+    def run(self, name, fn, *args, **kwargs):
+        calls = self.counter["calls"]
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            step = self.steps[name]
+            step["seconds"] += time.perf_counter() - start
+            step["calls"] += self.counter["calls"] - calls
+            step["runs"] += 1
+
+
+def run_mode(server, mode, n_agencies, target_reviews):
+    scraper = GoogleMapsScraper(implicit_wait=0, explicit_wait=10, maps_url=server.maps_url, pacer=Pacer(0, 0))
+    counter = count_commands(scraper.driver)
+    meter = StepMeter(counter)
+    n_reviews = 0
+    try:
+        start = time.perf_counter()
+        meter.run("search_places", scraper.search_places, "cih banque maroc")
+        links = meter.run("extract_agency_links", scraper.extract_agency_links, n_agencies)
+        for link in links:
+            meter.run("open_agency", scraper.driver.get, link)
+            meter.run("get_place_details", scraper.get_place_details)
+            if not meter.run("click_on_reviews", scraper.click_on_reviews):
+                continue
+            if mode == "in-page":
+                meter.run("scroll_and_expand", scraper.scroll_and_expand, target_reviews)
+            else:
+                meter.run("scroll_reviews", scraper.scroll_reviews, target_reviews)
+                meter.run("expand_reviews", scraper.expand_reviews)
+            reviews = meter.run("extract_reviews", scraper.extract_reviews, target_reviews)
+            n_reviews += len(reviews)
+        elapsed = time.perf_counter() - start
+    finally:
+        scraper.close()
+
+    total_calls = sum(step["calls"] for step in meter.steps.values())
+    return {
+        "mode": mode,
+        "agencies": len(links),
+        "reviews": n_reviews,
+        "seconds": elapsed,
+        "agencies_per_min": 60 * len(links) / elapsed if elapsed else 0,
+        "reviews_per_sec": n_reviews / elapsed if elapsed else 0,
+        "webdriver_calls": total_calls,
+        "calls_per_review": total_calls / n_reviews if n_reviews else None,
+        "steps": dict(meter.steps)
+    }
+
+
+def print_report(report):
+    print(f"\n== mode {report['mode']} ==")
+    print(f"{'étape':<24}{'exécutions':>12}{'temps (s)':>12}{'appels WD':>12}")
+    for name, step in report["steps"].items():
+        print(f"{name:<24}{step['runs']:>12}{step['seconds']:>12.2f}{step['calls']:>12}")
+    calls_per_review = report["calls_per_review"]
+    print(f"{report['agencies']} agences, {report['reviews']} avis en {report['seconds']:.1f}s : "
+          f"{report['agencies_per_min']:.1f} agences/min, {report['reviews_per_sec']:.1f} avis/s, "
+          f"{calls_per_review if calls_per_review is None else round(calls_per_review, 2)} appels WD/avis")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agencies", type=int, default=6)
+    parser.add_argument("--reviews", type=int, default=40, help="avis par agence")
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--delay-ms", type=int, default=300)
+    parser.add_argument("--mode", choices=["python", "in-page", "both"], default="both")
+    parser.add_argument("--recordings", help="dossier de pages enregistrées (search.html, place_<i>.html)")
+    parser.add_argument("--json", help="écrit le rapport JSON pour comparer deux exécutions")
+    args = parser.parse_args()
+
+    modes = ["python", "in-page"] if args.mode == "both" else [args.mode]
+    reports = []
+    with FixtureServer(n_agencies=args.agencies, reviews_per_agency=args.reviews, page_size=args.page_size,
+                       delay_ms=args.delay_ms, recordings=args.recordings) as server:
+        for mode in modes:
+            report = run_mode(server, mode, args.agencies, args.reviews)
+            print_report(report)
+            reports.append(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+
+    expected = args.agencies * args.reviews
+    missing = [r["mode"] for r in reports if r["reviews"] < expected]
+    if missing and not args.recordings:
+        print(f"\n! avis manquants (attendus: {expected}) en mode {', '.join(missing)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Compare les moteurs d'inférence du modèle de sentiment (model_registry.SENTIMENT_BACKENDS).
+
+Pour chaque moteur : temps de chargement, débit (avis/s), latence par lot
+(p50 / p95) et accord avec le modèle fp32 ("torch" sur CPU), sur les
+labels en étoiles et sur le sentiment NEGATIVE / NEUTRAL / POSITIVE.
+
+Les textes viennent d'un fichier de scraping (tableau JSON ou NDJSON) ou,
+à défaut, d'un corpus synthétique.
+
+Usage: python benchmarks/bench_sentiment_backend.py [resultats.json] [--limit 2000] [--backends torch int8 onnx]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, "transform"))
+
+import model_registry  # noqa: E402
+from subject_analysis import iter_review_chunks, preprocess_text, stars_to_sentiment, SENTIMENT_BATCH_SIZE  # noqa: E402
+from fixture_server import WORDS  # noqa: E402
+
+
+def load_texts(path, limit, seed=0):
+    if path:
+        texts = []
+        for chunk in iter_review_chunks(path):
+            texts += [t for t in chunk["text"].map(preprocess_text) if t]
+            if len(texts) >= limit:
+                break
+        return texts[:limit]
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.choice([5, 15, 40, 80]))) for _ in range(limit)]
+
+
+def run_backend(backend, texts, batch_size):
+    model_registry.clear()
+    model_registry.configure(sentiment_backend=backend, device="cpu")
+    start = time.perf_counter()
+    analyseur = model_registry.get_sentiment_pipeline()
+    load_time = time.perf_counter() - start
+
+    # Échauffement : premier lot hors mesure
+    analyseur(texts[:batch_size], batch_size=batch_size, truncation=True, max_length=512)
+
+    labels = []
+    latencies = []
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        batch_start = time.perf_counter()
+        predictions = analyseur(texts[i:i + batch_size], batch_size=batch_size, truncation=True, max_length=512)
+        latencies.append(time.perf_counter() - batch_start)
+        labels += [p["label"] for p in predictions]
+    elapsed = time.perf_counter() - start
+    return {
+        "backend": backend,
+        "load_s": load_time,
+        "reviews_per_s": len(texts) / elapsed,
+        "p50_ms": 1000 * float(np.percentile(latencies, 50)),
+        "p95_ms": 1000 * float(np.percentile(latencies, 95)),
+        "labels": labels
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", nargs="?", help="fichier de scraping (par défaut : corpus synthétique)")
+    parser.add_argument("--limit", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=SENTIMENT_BATCH_SIZE)
+    parser.add_argument("--backends", nargs="+", default=list(model_registry.SENTIMENT_BACKENDS))
+    args = parser.parse_args()
+
+    texts = load_texts(args.source, args.limit)
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    print(f"{len(texts)} avis, lots de {args.batch_size}")
+    print(f"{'moteur':<8}{'chargement (s)':>16}{'avis/s':>10}{'p50 lot (ms)':>14}{'p95 lot (ms)':>14}"
+          f"{'accord étoiles':>16}{'accord sentiment':>18}")
+
+    reference = None
+    for backend in backends:
+        try:
+            report = run_backend(backend, texts, args.batch_size)
+        except ImportError as e:
+            print(f"{backend:<8} indisponible: {e}")
+            continue
+        labels = np.array(report["labels"])
+        if reference is None:
+            reference = labels
+        stars_agreement = float((labels == reference).mean())
+        sentiment_agreement = float(
+            (stars_to_sentiment(labels).to_numpy() == stars_to_sentiment(reference).to_numpy()).mean()
+        )
+        print(f"{backend:<8}{report['load_s']:>16.1f}{report['reviews_per_s']:>10.1f}{report['p50_ms']:>14.0f}"
+              f"{report['p95_ms']:>14.0f}{stars_agreement:>16.1%}{sentiment_agreement:>18.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Débit de l'analyse de sentiment selon le nombre de processus (transformer(n_workers=...)).
+
+Génère un corpus synthétique d'avis, le découpe en blocs comme
+iter_review_chunks et le passe à iter_analyzed_chunks sans cache, pour
+chaque nombre de processus demandé. Le chargement des modèles dans les
+processus est compté dans le temps mesuré.
+
+Usage: python benchmarks/bench_transform_workers.py [n_avis] [workers ...]
+    python benchmarks/bench_transform_workers.py 4000 1 2 4
+"""
+import os
+import sys
+import time
+import random
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, "transform"))
+
+from subject_analysis import iter_analyzed_chunks  # noqa: E402
+from fixture_server import WORDS  # noqa: E402
+
+CHUNK_SIZE = 1000
+
+
+def synthetic_chunks(n_reviews, seed=0):
+    rng = random.Random(seed)
+    texts = [" ".join(rng.choice(WORDS) for _ in range(rng.choice([5, 15, 40, 80]))) for _ in range(n_reviews)]
+    for start in range(0, n_reviews, CHUNK_SIZE):
+        block = texts[start:start + CHUNK_SIZE]
+        yield pd.DataFrame({"text": block}, index=pd.RangeIndex(start, start + len(block)))
+
+
+def main(n_reviews, workers):
+    print(f"{'processus':>10}{'temps (s)':>12}{'avis/s':>10}{'accélération':>14}")
+    baseline = None
+    reference = None
+    for n_workers in workers:
+        start = time.perf_counter()
+        chunks = list(iter_analyzed_chunks(synthetic_chunks(n_reviews), n_workers=n_workers))
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"{n_workers:>10}{elapsed:>12.1f}{n_reviews / elapsed:>10.0f}{baseline / elapsed:>14.2f}")
+
+        labels = pd.concat(chunks)["sentiment"]
+        if reference is None:
+            reference = labels
+        elif not labels.equals(reference):
+            print("  ! sentiments différents du premier essai")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(args[0] if args else 4000, args[1:] or [1, 2, 4])
@@ -0,0 +1,322 @@
+"""Serveur HTTP local qui imite les pages Google Maps utilisées par le scraper.
+
+Il sert une page de recherche (cookies, champ de recherche, liste d'agences
+chargée au défilement) et une page par agence (détails, onglet des avis,
+avis chargés par pages au défilement, boutons "More"). Les sélecteurs CSS
+sont ceux de extract/google_maps_scraper.py.
+
+Des pages enregistrées depuis le navigateur peuvent remplacer les pages
+générées : recordings=<dossier> contenant search.html et/ou place_<i>.html.
+
+Usage:
+    with FixtureServer(n_agencies=6, reviews_per_agency=40) as server:
+        scraper = GoogleMapsScraper(maps_url=server.maps_url)
+        ...
+
+    python benchmarks/fixture_server.py   # sert les pages sur http://127.0.0.1:8765
+"""
+import os
+import re
+import json
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CITIES = ["Casablanca", "Rabat", "Marrakech", "Fès", "Tanger", "Agadir", "Oujda", "Meknès"]
+DATES = ["a day ago", "3 days ago", "a week ago", "2 weeks ago", "a month ago",
+         "3 months ago", "5 months ago", "a year ago", "2 years ago", "4 years ago"]
+WORDS = ["service", "accueil", "attente", "guichet", "personnel", "agence", "compte", "carte",
+         "rapide", "lent", "aimable", "problème", "conseiller", "banque", "horaires", "bien"]
+
+SEARCH_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Maps</title></head>
+<body>
+<div id="consent"><button onclick="document.getElementById('consent').remove()">Tout accepter</button></div>
+<input id="searchboxinput" type="text">
+<div class="m6QErb DxyBCb kA9KIf dS8AEf" id="results" style="height:600px;overflow-y:auto"></div>
+<script>
+const PLACES = __PLACES__;
+const PAGE = __PAGE_SIZE__, DELAY = __DELAY_MS__;
+const results = document.getElementById("results");
+let shown = 0, loading = false;
+function more() {
+  const next = Math.min(shown + PAGE, PLACES.length);
+  for (; shown < next; shown++) {
+    const a = document.createElement("a");
+    a.className = "hfpxzc";
+    a.href = PLACES[shown].href;
+    a.setAttribute("aria-label", PLACES[shown].name);
+    a.style.display = "block"; a.style.height = "120px";
+    a.textContent = PLACES[shown].name;
+    results.appendChild(a);
+  }
+  loading = false;
+}
+results.addEventListener("scroll", () => {
+  if (!loading && shown < PLACES.length && results.scrollTop + results.clientHeight >= results.scrollHeight - 150) {
+    loading = true; setTimeout(more, DELAY);
+  }
+});
+document.getElementById("searchboxinput").addEventListener("keydown", (e) => {
+  if (e.key === "Enter") setTimeout(more, DELAY);
+});
+</script>
+</body></html>"""
+
+PLACE_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>__NAME__</title></head>
+<body>
+<h1>__NAME__</h1>
+<button data-item-id="address">__ADDRESS__</button>
+<div class="F7nice"><div>__RATING__</div><div>(__COUNT__)</div></div>
+<button aria-label="Reviews for __NAME__" id="reviews-tab">Reviews</button>
+<button aria-label="Sort reviews" id="sort">Sort</button>
+<div role="menu" id="sort-menu" style="display:none">
+  <div role="menuitemradio">Most relevant</div><div role="menuitemradio" data-sort="newest">Newest</div>
+</div>
+<div role="feed" class="m6QErb DxyBCb" id="feed" style="height:700px;overflow-y:auto"></div>
+<script>
+const REVIEWS = __REVIEWS__;
+const PAGE = __PAGE_SIZE__, DELAY = __DELAY_MS__;
+const feed = document.getElementById("feed");
+let shown = 0, loading = false;
+function card(r) {
+  const div = document.createElement("div");
+  div.className = "jftiEf fontBodyMedium";
+  div.setAttribute("data-review-id", r.id);
+  div.style.minHeight = "140px";
+  div.innerHTML = '<div class="d4r55"></div>' +
+    '<span class="kvMYJc" role="img" aria-label="' + r.stars + ' stars"></span>' +
+    '<span class="rsqaWe"></span><div class="MyEned"><span class="wiI7pd"></span></div>';
+  div.querySelector(".d4r55").textContent = r.user;
+  div.querySelector(".rsqaWe").textContent = r.date;
+  const text = div.querySelector(".wiI7pd");
+  if (r.text.length > 120) {
+    text.textContent = r.text.slice(0, 120) + "…";
+    const more = document.createElement("button");
+    more.setAttribute("jsaction", "pane.review.expandReview");
+    more.textContent = "More";
+    more.addEventListener("click", () => { text.textContent = r.text; more.remove(); });
+    div.querySelector(".MyEned").appendChild(more);
+  } else {
+    text.textContent = r.text;
+  }
+  return div;
+}
+function more() {
+  const next = Math.min(shown + PAGE, REVIEWS.length);
+  for (; shown < next; shown++) feed.appendChild(card(REVIEWS[shown]));
+  loading = false;
+}
+feed.addEventListener("scroll", () => {
+  if (!loading && shown < REVIEWS.length && feed.scrollTop + feed.clientHeight >= feed.scrollHeight - 200) {
+    loading = true; setTimeout(more, DELAY);
+  }
+});
+document.getElementById("reviews-tab").addEventListener("click", () => setTimeout(more, DELAY));
+document.getElementById("sort").addEventListener("click", () => {
+  document.getElementById("sort-menu").style.display = "block";
+});
+document.querySelector("[data-sort=newest]").addEventListener("click", () => {
+  document.getElementById("sort-menu").style.display = "none";
+  REVIEWS.sort((a, b) => a.age - b.age);
+  feed.innerHTML = ""; shown = 0;
+  setTimeout(more, DELAY);
+});
+</script>
+</body></html>"""
+
+BROKEN_PAGE = "<!DOCTYPE html><html><body><p>Temporarily unavailable</p></body></html>"
+
+
+def make_place(index, reviews_per_agency, seed=0):
+    """Données déterministes d'une agence et de ses avis."""
+    rng = random.Random(seed * 100003 + index)
+    city = CITIES[index % len(CITIES)]
+    reviews = []
+    for k in range(reviews_per_agency):
+        reviews.append(_make_review(rng, f"{index}-{k}"))
+    return {
+        "name": f"CIH Bank Agence {index + 1}",
+        "address": f"{10 + index} Bd Mohammed V, {city} {20000 + index}",
+        "rating": f"{rng.uniform(2.5, 4.8):.1f}",
+        "reviews": reviews
+    }
+
+
+def _make_review(rng, key):
+    # age : rang de la date dans DATES, pour le tri "Newest"
+    age = rng.randrange(len(DATES))
+    n_words = rng.choice([0, 6, 15, 40, 80])
+    return {
+        "id": f"r{key}",
+        "user": f"Client {key}",
+        "stars": rng.randint(1, 5),
+        "date": DATES[age],
+        "age": age,
+        "text": " ".join(rng.choice(WORDS) for _ in range(n_words))
+    }
+
+
+def render_reviews_snapshot(n_reviews, seed=0):
+    """Page d'agence figée avec n_reviews cartes d'avis déjà chargées et dépliées.
+
+    Équivalent d'une page enregistrée depuis le navigateur après défilement,
+    pour mesurer l'extraction sans dépendre du chargement au défilement.
+    """
+    place = make_place(0, n_reviews, seed)
+    cards = "\n".join(
+        '<div class="jftiEf fontBodyMedium" data-review-id="{id}">'
+        '<div class="d4r55">{user}</div>'
+        '<span class="kvMYJc" role="img" aria-label="{stars} stars"></span>'
+        '<span class="rsqaWe">{date}</span>'
+        '<div class="MyEned"><span class="wiI7pd">{text}</span></div>'
+        '</div>'.format(**{k: _escape(str(v)) for k, v in r.items()})
+        for r in place["reviews"]
+    )
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>{name}</title></head><body>'
+        '<h1>{name}</h1><button data-item-id="address">{address}</button>'
+        '<div role="feed" class="m6QErb DxyBCb">{cards}</div></body></html>'
+    ).format(name=_escape(place["name"]), address=_escape(place["address"]), cards=cards)
+
+
+class FixtureServer:
+    """Serveur de pages factices, lancé dans un thread.
+
+    Args:
+        n_agencies (int): nombre d'agences dans les résultats de recherche
+        reviews_per_agency (int): nombre d'avis par agence
+        page_size (int): éléments ajoutés à chaque chargement au défilement
+        delay_ms (int): latence simulée de chaque chargement
+        flaky (iterable): indices d'agences dont la première visite renvoie une page cassée
+        port (int): 0 pour un port libre
+        recordings (str): dossier de pages enregistrées servies à la place des pages générées
+    """
+
+    def __init__(self, n_agencies=6, reviews_per_agency=40, page_size=10, delay_ms=300,
+                 flaky=(), port=0, seed=0, recordings=None):
+        self.places = [make_place(i, reviews_per_agency, seed) for i in range(n_agencies)]
+        self.page_size = page_size
+        self.delay_ms = delay_ms
+        self.flaky = set(flaky)
+        self.recordings = recordings
+        self.hits = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = None
+
+    def add_reviews(self, index, n, seed=1):
+        """Publie n nouveaux avis (les plus récents) sur une agence, pour le mode incrémental."""
+        rng = random.Random(seed * 100003 + index)
+        place = self.places[index]
+        start = len(place["reviews"])
+        new = [_make_review(rng, f"{index}-{start + k}") for k in range(n)]
+        for review in new:
+            review["date"], review["age"] = "an hour ago", -1
+        place["reviews"] = new + place["reviews"]
+        return new
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    @property
+    def maps_url(self):
+        return f"{self.base_url}/maps?hl=en"
+
+    def place_url(self, index):
+        return f"{self.base_url}/place/{index}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def render(self, path):
+        """Retourne (statut, html) pour un chemin."""
+        if path.startswith("/maps"):
+            recorded = self._recorded("search.html")
+            if recorded is not None:
+                return 200, recorded
+            places = [{"name": p["name"], "href": self.place_url(i)} for i, p in enumerate(self.places)]
+            return 200, _fill(SEARCH_PAGE, PLACES=json.dumps(places), PAGE_SIZE=self.page_size,
+                              DELAY_MS=self.delay_ms)
+
+        match = re.match(r"^/place/(\d+)", path)
+        if not match or int(match.group(1)) >= len(self.places):
+            return 404, BROKEN_PAGE
+        index = int(match.group(1))
+        with self._lock:
+            self.hits[index] = self.hits.get(index, 0) + 1
+            first_visit = self.hits[index] == 1
+        if index in self.flaky and first_visit:
+            return 503, BROKEN_PAGE
+
+        recorded = self._recorded(f"place_{index}.html")
+        if recorded is not None:
+            return 200, recorded
+
+        place = self.places[index]
+        return 200, _fill(
+            PLACE_PAGE,
+            NAME=_escape(place["name"]), ADDRESS=_escape(place["address"]), RATING=place["rating"],
+            COUNT=len(place["reviews"]), REVIEWS=json.dumps(place["reviews"], ensure_ascii=False),
+            PAGE_SIZE=self.page_size, DELAY_MS=self.delay_ms
+        )
+
+    def _recorded(self, name):
+        if not self.recordings:
+            return None
+        path = os.path.join(self.recordings, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, html = server.render(self.path)
+                body = html.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def _fill(template, **values):
+    for key, value in values.items():
+        template = template.replace(f"__{key}__", str(value))
+    return template
+
+
+def _escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+if __name__ == "__main__":
+    server = FixtureServer(port=8765).start()
+    print(f"Pages de test sur {server.maps_url} (Ctrl+C pour arrêter)")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
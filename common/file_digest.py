@@ -0,0 +1,10 @@
+import hashlib
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Empreinte SHA-256 d'un fichier, lu par blocs."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
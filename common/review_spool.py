@@ -0,0 +1,181 @@
+import os
+import json
+import time
+
+# Dossier d'échange entre le scraping (producteur) et le transform (consommateur)
+SPOOL_DIR = os.environ.get("CIH_SPOOL_DIR", "~/airflow/reviews_DB_source/spool")
+
+# Segments en attente au-delà desquels le producteur attend le consommateur
+MAX_PENDING_SEGMENTS = 50
+
+# put() n'attend le consommateur que s'il s'est manifesté dans ce délai (secondes)...
+CONSUMER_TIMEOUT = 300
+# ... et au plus MAX_PUT_WAIT secondes par agence
+MAX_PUT_WAIT = 600
+
+DONE_MARKER = "DONE"
+HEARTBEAT_MARKER = "CONSUMER"
+
+
+class ReviewSpool:
+    """File d'agences scrapées sur disque, un segment NDJSON par agence.
+
+    Le scraper dépose chaque agence dès qu'elle est terminée (put), le
+    transform la consomme en parallèle (consume). Un segment est écrit dans
+    un fichier temporaire puis renommé : le consommateur ne voit jamais de
+    segment incomplet. Quand max_pending segments attendent, put() bloque
+    jusqu'à ce que le transform rattrape son retard, tant que celui-ci est
+    actif (battement de cœur récent). Si aucun transform n'a lu la file
+    pendant le scraping, finalize_crawl supprime les segments (discard) : le
+    transform lit alors le fichier final du crawl.
+
+    run_id (ex: run_id Airflow, le même pour le scraping et le transform) lie
+    le marqueur de fin à une exécution : le marqueur laissé par une exécution
+    interrompue n'arrête pas le consommateur de l'exécution suivante.
+
+    Les segments lus passent dans consumed/ et ne sont supprimés qu'à
+    commit(), une fois les résultats du transform écrits : après un arrêt du
+    transform, ils sont relus à l'exécution suivante.
+    """
+
+    def __init__(self, folder=SPOOL_DIR, max_pending=MAX_PENDING_SEGMENTS, poll_interval=1.0, run_id=None,
+                 consumer_timeout=CONSUMER_TIMEOUT, max_wait=MAX_PUT_WAIT):
+        self.folder = os.path.expanduser(folder)
+        self.consumed_folder = os.path.join(self.folder, "consumed")
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.run_id = run_id
+        self.consumer_timeout = consumer_timeout
+        self.max_wait = max_wait
+        os.makedirs(self.consumed_folder, exist_ok=True)
+        self._seq = self._last_seq()
+        self._started = 0.0
+
+    def _segments(self, folder=None):
+        folder = folder or self.folder
+        return sorted(name for name in os.listdir(folder) if name.startswith("seg-") and name.endswith(".ndjson"))
+
+    def _last_seq(self):
+        names = self._segments() + self._segments(self.consumed_folder)
+        return max((int(name[4:12]) for name in names), default=0)
+
+    def pending(self):
+        return len(self._segments())
+
+    def _marker(self, name):
+        return os.path.join(self.folder, name)
+
+    # Producteur
+
+    def start(self):
+        """Début du scraping : efface le marqueur de fin laissé par une exécution interrompue."""
+        self._started = time.time()
+        if os.path.exists(self._marker(DONE_MARKER)):
+            os.remove(self._marker(DONE_MARKER))
+
+    def consumer_alive(self):
+        """Vrai si un consommateur a lu la file depuis moins de consumer_timeout secondes."""
+        try:
+            return time.time() - os.path.getmtime(self._marker(HEARTBEAT_MARKER)) < self.consumer_timeout
+        except OSError:
+            return False
+
+    def consumer_seen(self):
+        """Vrai si un consommateur a lu la file depuis start()."""
+        try:
+            return os.path.getmtime(self._marker(HEARTBEAT_MARKER)) >= self._started
+        except OSError:
+            return False
+
+    def put(self, result):
+        """Ajoute une agence scrapée, après avoir attendu si le consommateur actif est en retard.
+
+        Returns:
+            float: temps passé à attendre le consommateur (secondes)
+        """
+        waited = 0.0
+        while self.pending() >= self.max_pending and self.consumer_alive():
+            if waited >= self.max_wait:
+                print(f"Spool: consommateur en retard depuis {waited:.0f}s, agence ajoutée sans attendre")
+                break
+            time.sleep(self.poll_interval)
+            waited += self.poll_interval
+
+        self._seq += 1
+        path = os.path.join(self.folder, f"seg-{self._seq:08d}.ndjson")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        os.replace(path + ".tmp", path)
+        return waited
+
+    def close(self):
+        """Signale la fin du scraping : le consommateur s'arrête une fois la file vidée."""
+        with open(self._marker(DONE_MARKER), "w", encoding="utf-8") as f:
+            f.write(self.run_id or "")
+
+    def discard(self):
+        """Supprime les segments en attente, quand aucun consommateur ne les lira.
+
+        Returns:
+            int: nombre de segments supprimés
+        """
+        names = self._segments()
+        for name in names:
+            os.remove(os.path.join(self.folder, name))
+        return len(names)
+
+    def is_closed(self):
+        """Vrai si le scraping est terminé (celui de la même exécution quand run_id est donné)."""
+        try:
+            with open(self._marker(DONE_MARKER), encoding="utf-8") as f:
+                done_run = f.read()
+        except FileNotFoundError:
+            return False
+        return self.run_id is None or done_run == self.run_id
+
+    # Consommateur
+
+    def heartbeat(self):
+        with open(self._marker(HEARTBEAT_MARKER), "w"):
+            pass
+
+    def consume(self, idle_marker=True):
+        """Parcourt les agences dans l'ordre de dépôt, jusqu'à la fin du scraping.
+
+        Les segments d'une exécution précédente non validée sont relus en premier.
+
+        Yields:
+            dict: une agence {place_details, reviews, ...} ; None quand la file est
+            momentanément vide (si idle_marker), pour permettre de traiter ce qui
+            a déjà été lu sans attendre la suite
+        """
+        for name in self._segments(self.consumed_folder):
+            os.replace(os.path.join(self.consumed_folder, name), os.path.join(self.folder, name))
+
+        while True:
+            self.heartbeat()
+            names = self._segments()
+            if not names:
+                if self.is_closed() and not self._segments():
+                    return
+                if idle_marker:
+                    yield None
+                time.sleep(self.poll_interval)
+                continue
+            for name in names:
+                self.heartbeat()
+                consumed_path = os.path.join(self.consumed_folder, name)
+                os.replace(os.path.join(self.folder, name), consumed_path)
+                with open(consumed_path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            yield json.loads(line)
+
+    def commit(self):
+        """Supprime les segments consommés (leurs résultats sont écrits) et réinitialise la file si elle est close."""
+        for name in self._segments(self.consumed_folder):
+            os.remove(os.path.join(self.consumed_folder, name))
+        if self.is_closed() and not self._segments():
+            os.remove(self._marker(DONE_MARKER))
+            if os.path.exists(self._marker(HEARTBEAT_MARKER)):
+                os.remove(self._marker(HEARTBEAT_MARKER))
@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import resource
+import datetime
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+# Rapports des exécutions : JSON par exécution et fichier texte Prometheus
+# (à placer dans le dossier du textfile collector de node_exporter)
+METRICS_DIR = os.environ.get("CIH_METRICS_DIR", "~/airflow/reviews_DB_source/metrics")
+
+# Nombre maximal de latences gardées par étape pour les quantiles
+MAX_SAMPLES = 100000
+
+# Intervalle d'échantillonnage de la mémoire résidente pendant les étapes (s)
+RSS_SAMPLE_INTERVAL = 0.05
+
+
+class StageMetrics:
+    """Mesures cumulées d'une étape : temps, éléments traités, latences par élément, appels WebDriver."""
+
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.seconds = 0.0
+        self.items = 0
+        self.calls = 0
+        self.peak_rss = 0
+        self.latencies = []
+
+    def observe(self, seconds, items=1, calls=0, peak_rss=None):
+        """Ajoute une exécution de l'étape ; la latence par élément est seconds / items.
+
+        peak_rss: pic de mémoire résidente pendant l'exécution ; par défaut la
+        mémoire résidente au moment de l'appel.
+        """
+        self.runs += 1
+        self.seconds += seconds
+        self.items += items
+        self.calls += calls
+        self.peak_rss = max(self.peak_rss, current_rss_bytes() if peak_rss is None else peak_rss)
+        if items and len(self.latencies) < MAX_SAMPLES:
+            self.latencies.append(seconds / items)
+
+    def summary(self):
+        latencies = np.array(self.latencies) if self.latencies else None
+        return {
+            "runs": self.runs,
+            "seconds": round(self.seconds, 3),
+            "items": self.items,
+            "items_per_sec": round(self.items / self.seconds, 3) if self.seconds else None,
+            "p50_item_latency": float(np.percentile(latencies, 50)) if latencies is not None else None,
+            "p95_item_latency": float(np.percentile(latencies, 95)) if latencies is not None else None,
+            "webdriver_calls": self.calls,
+            "peak_rss_bytes": self.peak_rss
+        }
+
+
+class StageTimer:
+    """Résultat d'un bloc `with run.stage(...)` : renseigner items (et calls) avant la sortie."""
+
+    def __init__(self, items=0, calls=0):
+        self.items = items
+        self.calls = calls
+
+
+class RunMetrics:
+    """Mesures d'une exécution (extract, transform ou load), par étape.
+
+    Usage:
+        metrics = get_run("transform")
+        with metrics.stage("sentiment") as stage:
+            ...
+            stage.items = len(df)
+        metrics.write_report()
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.datetime.now()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def get_stage(self, name):
+        with self._lock:
+            if name not in self.stages:
+                self.stages[name] = StageMetrics(name)
+            return self.stages[name]
+
+    @contextmanager
+    def stage(self, name, items=0):
+        timer = StageTimer(items)
+        process_peak = peak_rss_bytes()
+        token = _rss_sampler.begin()
+        start = time.perf_counter()
+        try:
+            yield timer
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = _rss_sampler.end(token)
+            # Nouveau pic du processus pendant l'étape : valeur exacte, même entre deux échantillons
+            if peak_rss_bytes() > process_peak:
+                peak = max(peak, peak_rss_bytes())
+            self.get_stage(name).observe(elapsed, timer.items, timer.calls, peak)
+
+    def report(self):
+        return {
+            "run": self.name,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "stages": {name: stage.summary() for name, stage in self.stages.items()}
+        }
+
+    def write_report(self, folder=METRICS_DIR):
+        """Écrit le rapport JSON horodaté de l'exécution et le fichier Prometheus <run>.prom.
+
+        Returns:
+            str: chemin du rapport JSON
+        """
+        folder = os.path.expanduser(folder)
+        os.makedirs(folder, exist_ok=True)
+        report = self.report()
+        stamp = self.started_at.strftime("%Y%m%dT%H%M%S")
+        json_path = os.path.join(folder, f"{self.name}_{stamp}.json")
+        _atomic_write(json_path, json.dumps(report, indent=2))
+        _atomic_write(os.path.join(folder, f"{self.name}.prom"), prometheus_text(report))
+        print(f"Rapport de l'exécution {self.name}: {json_path}")
+        return json_path
+
+
+def prometheus_text(report):
+    """Format d'exposition Prometheus d'un rapport (une série par étape).
+
+    Le fichier est réécrit à chaque exécution avec les valeurs de cette seule
+    exécution : toutes les séries sont des gauges (pas de compteurs cumulés).
+    """
+    run = report["run"]
+    metrics = [
+        ("cih_stage_seconds", "gauge", "Temps passé dans l'étape pendant l'exécution", "seconds"),
+        ("cih_stage_items", "gauge", "Éléments traités par l'étape pendant l'exécution", "items"),
+        ("cih_stage_items_per_second", "gauge", "Débit de l'étape", "items_per_sec"),
+        ("cih_stage_webdriver_calls", "gauge", "Appels WebDriver de l'étape pendant l'exécution", "webdriver_calls"),
+        ("cih_stage_peak_rss_bytes", "gauge", "Pic de mémoire résidente pendant l'étape", "peak_rss_bytes"),
+    ]
+    lines = []
+    for metric, kind, help_text, field in metrics:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        for stage, values in report["stages"].items():
+            if values[field] is not None:
+                lines.append(f'{metric}{{run="{run}",stage="{stage}"}} {values[field]}')
+
+    metric = "cih_stage_item_latency_seconds"
+    lines += [f"# HELP {metric} Latence par élément (quantiles de l'exécution)", f"# TYPE {metric} gauge"]
+    for stage, values in report["stages"].items():
+        for quantile, field in (("0.5", "p50_item_latency"), ("0.95", "p95_item_latency")):
+            if values[field] is not None:
+                lines.append(f'{metric}{{run="{run}",stage="{stage}",quantile="{quantile}"}} {values[field]}')
+
+    finished = datetime.datetime.fromisoformat(report["finished_at"]).timestamp()
+    lines += [
+        "# HELP cih_run_last_finished_timestamp_seconds Fin de la dernière exécution",
+        "# TYPE cih_run_last_finished_timestamp_seconds gauge",
+        f'cih_run_last_finished_timestamp_seconds{{run="{run}"}} {finished}'
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def peak_rss_bytes():
+    """Pic de mémoire résidente du processus depuis son démarrage (ru_maxrss est en Ko sous Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def current_rss_bytes():
+    """Mémoire résidente actuelle du processus (/proc/self/statm, à défaut le pic du processus)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return peak_rss_bytes()
+
+
+class RssSampler:
+    """Échantillonne la mémoire résidente tant qu'au moins une étape est en cours.
+
+    Un seul thread de fond pour tout le processus, arrêté quand aucune étape
+    n'est mesurée ; chaque étape en cours garde le maximum observé.
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._peaks = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def begin(self):
+        token = object()
+        with self._lock:
+            self._peaks[token] = current_rss_bytes()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self._thread.start()
+        return token
+
+    def end(self, token):
+        """Pic de mémoire résidente observé depuis begin()."""
+        rss = current_rss_bytes()
+        with self._lock:
+            return max(self._peaks.pop(token), rss)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            rss = current_rss_bytes()
+            with self._lock:
+                if not self._peaks:
+                    self._thread = None
+                    return
+                for token, peak in self._peaks.items():
+                    self._peaks[token] = max(peak, rss)
+
+
+_rss_sampler = RssSampler()
+
+
+def _atomic_write(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+# Exécutions en cours dans le processus
+_runs = {}
+_lock = threading.Lock()
+
+
+def get_run(name):
+    """Mesures de l'exécution `name`, partagées par tout le processus."""
+    with _lock:
+        if name not in _runs:
+            _runs[name] = RunMetrics(name)
+        return _runs[name]
+
+
+def finish_run(name, folder=METRICS_DIR):
+    """Écrit le rapport de l'exécution `name` et l'oublie (la suivante repart de zéro)."""
+    with _lock:
+        run = _runs.pop(name, None)
+    if run is None:
+        return None
+    return run.write_report(folder)
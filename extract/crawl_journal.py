@@ -0,0 +1,105 @@
+import os
+import json
+
+
+class CrawlJournal:
+    """Journal de crawl reprenable.
+
+    Chaque agence scrapée est ajoutée en une ligne NDJSON à la fin du journal
+    (jamais réécrit), et un petit fichier de checkpoint liste les liens déjà
+    terminés. Après un arrêt brutal, une nouvelle exécution saute ces agences.
+    Le fichier final est assemblé depuis le journal en flux, dans l'ordre des
+    liens.
+    """
+
+    def __init__(self, folder, name="crawl"):
+        os.makedirs(folder, exist_ok=True)
+        self.journal_path = os.path.join(folder, f"{name}_journal.ndjson")
+        self.checkpoint_path = os.path.join(folder, f"{name}_checkpoint.json")
+        self.done = self._load_checkpoint()
+        self._terminate_last_line()
+        if self.done:
+            print(f"Reprise du crawl: {len(self.done)} agences déjà scrapées")
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return set()
+        with open(self.checkpoint_path, encoding="utf-8") as f:
+            return set(json.load(f).get("done", []))
+
+    def _terminate_last_line(self):
+        """Après un arrêt brutal, isole la dernière ligne tronquée pour ne pas corrompre la suivante."""
+        if not os.path.exists(self.journal_path) or os.path.getsize(self.journal_path) == 0:
+            return
+        with open(self.journal_path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    def is_done(self, link):
+        return link in self.done
+
+    def record(self, index, link, result):
+        """Ajoute le résultat d'une agence au journal puis met à jour le checkpoint."""
+        line = json.dumps({"index": index, "link": link, "result": result}, ensure_ascii=False)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.done.add(link)
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"done": sorted(self.done)}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _entries(self):
+        """Position dans le journal de la dernière entrée valide de chaque lien, triées par index."""
+        latest = {}
+        if not os.path.exists(self.journal_path):
+            return []
+        with open(self.journal_path, "rb") as f:
+            offset = 0
+            for raw in f:
+                try:
+                    entry = json.loads(raw)
+                    latest[entry["link"]] = (entry["index"], offset)
+                except ValueError:
+                    # Dernière ligne tronquée par un arrêt brutal
+                    pass
+                offset += len(raw)
+        return sorted(latest.values())
+
+    def iter_results(self):
+        """Parcourt les résultats du journal dans l'ordre des liens, sans doublons (aucun si journal vide)."""
+        entries = self._entries()
+        if not entries:
+            return
+        with open(self.journal_path, "rb") as f:
+            for _, offset in entries:
+                f.seek(offset)
+                yield json.loads(f.readline())["result"]
+
+    def __len__(self):
+        return len(self._entries())
+
+    def assemble(self, final_path):
+        """Écrit le tableau JSON final à partir du journal, une agence à la fois."""
+        tmp_path = final_path + ".tmp"
+        count = 0
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("[")
+            for result in self.iter_results():
+                f.write(",\n" if count else "\n")
+                f.write(json.dumps(result, ensure_ascii=False, indent=4))
+                count += 1
+            f.write("\n]\n")
+        os.replace(tmp_path, final_path)
+        return count
+
+    def finish(self):
+        """Clôt le crawl : la prochaine exécution repartira de zéro."""
+        for path in (self.journal_path, self.checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.done = set()
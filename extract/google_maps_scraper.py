@@ -1,10 +1,12 @@
+import sys
 import time
 import random
 import pandas as pd
 import re
-import json
-import unicodedata
 import os
+import shutil
+import datetime
+from collections import defaultdict
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
@@ -13,18 +15,206 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
+from crawl_journal import CrawlJournal
+from review_watermark import ReviewWatermarks, review_fingerprint, agency_key
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+from run_metrics import get_run, finish_run
+from review_spool import ReviewSpool
 
 
 save_folder = os.path.expanduser("~/airflow/reviews_DB_source")
 os.makedirs(save_folder, exist_ok=True)
 
+MAPS_URL = "https://www.google.com/maps?hl=en"
+
+# Binaire chromedriver : CHROMEDRIVER_PATH, sinon le chemin mis en cache au premier
+# téléchargement (ChromeDriverManager n'est appelé qu'une fois, le scraper démarre hors ligne ensuite)
+DRIVER_CACHE_FILE = os.path.expanduser("~/.cache/cih_scraper/chromedriver_path")
+
+# Ressources bloquées (CDP Network.setBlockedURLs) : images, polices, médias et tuiles de carte
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.mp4", "*.webm", "*.mp3",
+    "*/maps/vt*", "*/kh/v=*", "*/maps/preview/tile*", "*googleusercontent.com/*"
+]
+
+# Mode incrémental : empreintes des derniers avis vus par agence, avis chargés par lots
+WATERMARKS_PATH = os.path.join(save_folder, "review_watermarks.json")
+INCREMENTAL_BATCH = 20
+
+# Lecture de toutes les cartes d'avis chargées en un seul appel execute_script
+EXTRACT_REVIEWS_JS = """
+const limit = arguments[0];
+const cards = document.querySelectorAll("div.jftiEf.fontBodyMedium");
+const reviews = [];
+for (let i = 0; i < Math.min(cards.length, limit); i++) {
+    const card = cards[i];
+    const user = card.querySelector("div.d4r55");
+    const rating = card.querySelector("span[aria-label*='étoiles'], span[aria-label*='star']");
+    const date = card.querySelector("span.rsqaWe");
+    const text = card.querySelector("span.wiI7pd");
+    reviews.push({
+        user_name: user ? user.innerText : null,
+        rating_label: rating ? rating.getAttribute("aria-label") : null,
+        date: date ? date.innerText : null,
+        text: text ? text.innerText : ""
+    });
+}
+return reviews;
+"""
+
+# Défilement et dépliage des avis dans la page, en un seul appel asynchrone.
+# Fait défiler le fil jusqu'à `target` avis ou jusqu'à la fin (aucune mutation du
+# fil pendant `idleMs`), puis clique sur tous les boutons "More" et attend que les
+# textes soient dépliés (plus aucun bouton, ou longueur des textes stable).
+SCROLL_AND_EXPAND_JS = """
+const target = arguments[0], timeoutMs = arguments[1], idleMs = arguments[2];
+const done = arguments[arguments.length - 1];
+const CARD = "div.jftiEf.fontBodyMedium";
+const MORE = "button[jsaction*='pane.review.expandReview']";
+const TEXT = "span.wiI7pd";
+const EXPAND_POLL_MS = 100, EXPAND_STABLE_MS = 500, EXPAND_TIMEOUT_MS = 5000;
+const feed = document.querySelector("div[role='feed']")
+    || document.querySelector("div.m6QErb.DxyBCb")
+    || document.querySelector("div.m6QErb.scrollable-auto");
+if (!feed) {
+    done({error: "élément de défilement introuvable"});
+    return;
+}
+const start = Date.now();
+const progress = [];
+let idleTimer = null, finished = false;
+const count = () => document.querySelectorAll(CARD).length;
+const textLength = () => Array.from(document.querySelectorAll(TEXT)).reduce((n, t) => n + t.textContent.length, 0);
+const observer = new MutationObserver(() => step());
+function finish(reason) {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    clearTimeout(idleTimer);
+    let expanded = 0;
+    document.querySelectorAll(MORE).forEach(button => { button.click(); expanded++; });
+    const report = () => done({count: count(), expanded: expanded, reason: reason, progress: progress,
+                               elapsed_ms: Date.now() - start});
+    if (!expanded) return report();
+    // Le dépliage peut être asynchrone : attendre qu'il soit terminé avant de rendre la main
+    const expandStart = Date.now();
+    let length = textLength(), stableSince = Date.now();
+    const poll = () => {
+        const now = Date.now(), current = textLength();
+        if (current !== length) {
+            length = current;
+            stableSince = now;
+        }
+        if (!document.querySelector(MORE) || now - stableSince >= EXPAND_STABLE_MS
+                || now - expandStart >= EXPAND_TIMEOUT_MS) {
+            return report();
+        }
+        setTimeout(poll, EXPAND_POLL_MS);
+    };
+    setTimeout(poll, 0);
+}
+function step() {
+    if (finished) return;
+    const n = count();
+    if (!progress.length || progress[progress.length - 1].count !== n) {
+        progress.push({ms: Date.now() - start, count: n});
+    }
+    if (n >= target) return finish("target");
+    if (Date.now() - start > timeoutMs) return finish("timeout");
+    feed.scrollTop = feed.scrollHeight;
+    clearTimeout(idleTimer);
+    idleTimer = setTimeout(() => finish("end"), idleMs);
+}
+observer.observe(feed, {childList: true, subtree: true});
+step();
+"""
+
+# Attente maximale d'un nouveau lot de résultats / d'avis après un défilement (s)
+SCROLL_WAIT_TIMEOUT = 3
+# Défilements consécutifs sans nouveau résultat avant de considérer la liste terminée
+LIST_END_ATTEMPTS = 3
+# Attente avant de réessayer après une erreur de défilement (doublée à chaque échec, plafonnée, s)
+SCROLL_RETRY_DELAY = 0.5
+SCROLL_RETRY_MAX_DELAY = 8
+
+# Pauses fixes utilisées avant les attentes conditionnelles (s), pour estimer le temps gagné
+LEGACY_SLEEPS = {
+    "cookies": 1.0,
+    "search_results": 3.0,
+    "agency_links_scroll": 1.25,
+    "open_agency": 2.0,
+    "open_reviews": 1.5,
+    "scroll_reviews": 1.0,
+    "expand_reviews": 0.15
+}
+
+class Pacer:
+    """Pauses de politesse entre deux agences, séparées des attentes conditionnelles.
+
+    Ce sont les seules pauses fixes du scraper : elles limitent le rythme des
+    requêtes pour éviter d'être bloqué, pas pour attendre le chargement des pages.
+    """
+    def __init__(self, min_delay=1.5, max_delay=3.0):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.total = 0.0
+
+    def pace(self):
+        delay = random.uniform(self.min_delay, self.max_delay)
+        time.sleep(delay)
+        self.total += delay
+        return delay
+
+def resolve_driver_path():
+    """Chemin du binaire chromedriver, sans accès réseau quand il est déjà connu."""
+    env_path = os.environ.get("CHROMEDRIVER_PATH")
+    if env_path and os.path.exists(env_path):
+        return env_path
+
+    if os.path.exists(DRIVER_CACHE_FILE):
+        with open(DRIVER_CACHE_FILE, encoding="utf-8") as f:
+            cached_path = f.read().strip()
+        if os.path.exists(cached_path):
+            return cached_path
+
+    system_path = shutil.which("chromedriver")
+    if system_path:
+        return system_path
+
+    driver_path = ChromeDriverManager().install()
+    os.makedirs(os.path.dirname(DRIVER_CACHE_FILE), exist_ok=True)
+    with open(DRIVER_CACHE_FILE, "w", encoding="utf-8") as f:
+        f.write(driver_path)
+    return driver_path
+
 class GoogleMapsScraper:
     """Classe pour scraper Google Maps à la recherche d'agences CIH Bank au Maroc."""
-    def __init__(self, implicit_wait=10, explicit_wait=10):
-        """Initialisation du scraper avec configuration du navigateur."""
+    def __init__(self, implicit_wait=10, explicit_wait=10, maps_url=MAPS_URL, pacer=None,
+                 incremental=False, watermarks_path=WATERMARKS_PATH, headless=True, block_resources=True,
+                 metrics_run="extract"):
+        """Initialisation du scraper avec configuration du navigateur.
+
+        maps_url permet de pointer vers un serveur local de test au lieu de Google Maps.
+        pacer règle les pauses de politesse entre agences (Pacer(0, 0) pour les désactiver).
+        incremental: ne collecter que les avis publiés depuis le dernier scraping de chaque agence.
+        headless / block_resources: profil léger (pas de fenêtre, ni images, polices,
+        médias ou tuiles de carte) pour réduire la mémoire par navigateur et accélérer les pages.
+        metrics_run: nom de l'exécution dans les rapports de mesures (run_metrics).
+        """
+        self.maps_url = maps_url
+        self.incremental = incremental
+        self.watermarks = ReviewWatermarks(watermarks_path) if incremental else None
+        self.explicit_wait = explicit_wait
+        self.pacer = pacer or Pacer()
+        # Temps passé dans les attentes conditionnelles, par étape
+        self.timings = defaultdict(lambda: {"count": 0, "waited": 0.0})
+        self.metrics_run = metrics_run
         options = webdriver.ChromeOptions()
-        # Uncomment to run in headless mode
-        # options.add_argument('--headless')
+        if headless:
+            options.add_argument('--headless=new')
         options.add_argument('--no-sandbox')
         options.add_argument('--disable-dev-shm-usage')
         options.add_argument('--disable-blink-features=AutomationControlled')
@@ -34,20 +224,84 @@ class GoogleMapsScraper:
         # Disable automation flags
         options.add_experimental_option("excludeSwitches", ["enable-automation"])
         options.add_experimental_option('useAutomationExtension', False)
+
+        if block_resources:
+            options.add_argument('--blink-settings=imagesEnabled=false')
+            options.add_argument('--disable-extensions')
+            options.add_argument('--mute-audio')
+            options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
         
-        self.driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+        self.driver = webdriver.Chrome(service=Service(resolve_driver_path()), options=options)
+        self._count_webdriver_calls()
+        if block_resources:
+            self.block_resources()
         
         # Set implicit and explicit waits
         self.driver.implicitly_wait(implicit_wait)
         self.wait = WebDriverWait(self.driver, explicit_wait)
 
-    @staticmethod
-    def sanitize_filename(name):
-        """Nettoie un nom de fichier pour éviter les caractères non valides."""
-        name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')  # enlève accents
-        name = re.sub(r'[^\w\s-]', '', name).strip().lower()
-        return re.sub(r'[-\s]+', '_', name)
-    
+    def _count_webdriver_calls(self):
+        """Compte les commandes envoyées au navigateur (self.webdriver_calls)."""
+        self.webdriver_calls = 0
+        execute = self.driver.execute
+
+        def counted_execute(*args, **kwargs):
+            self.webdriver_calls += 1
+            return execute(*args, **kwargs)
+
+        self.driver.execute = counted_execute
+
+    def block_resources(self, patterns=BLOCKED_URL_PATTERNS):
+        """Bloque les requêtes inutiles au scraping via le protocole DevTools."""
+        try:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+        except Exception as e:
+            print(f"Blocage des ressources indisponible: {e}")
+
+    def reset_session(self):
+        """Vide la session (cookies, stockage) sans relancer le navigateur."""
+        try:
+            self.driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            self.driver.delete_all_cookies()
+            self.driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+            self.driver.get("about:blank")
+        except Exception as e:
+            print(f"Réinitialisation de la session impossible: {e}")
+
+    def count_elements(self, selector):
+        """Nombre d'éléments correspondant au sélecteur (sans attente implicite)."""
+        return self.driver.execute_script("return document.querySelectorAll(arguments[0]).length", selector)
+
+    def wait_for(self, step, condition, timeout=None, count=1):
+        """Attend que condition(driver) soit vraie et enregistre le temps d'attente.
+
+        Returns:
+            bool: False si le délai a expiré
+        """
+        start = time.perf_counter()
+        try:
+            WebDriverWait(self.driver, timeout or self.explicit_wait, poll_frequency=0.1).until(condition)
+            return True
+        except TimeoutException:
+            return False
+        finally:
+            self.timings[step]["count"] += count
+            self.timings[step]["waited"] += time.perf_counter() - start
+
+    def timing_report(self):
+        """Affiche le temps d'attente par étape et le gain par rapport aux anciennes pauses fixes."""
+        total_waited = total_legacy = 0.0
+        print(f"{'étape':<22}{'nb':>6}{'attendu (s)':>14}{'pauses fixes (s)':>18}{'gagné (s)':>12}")
+        for step, timing in sorted(self.timings.items()):
+            legacy = LEGACY_SLEEPS.get(step, 0.0) * timing["count"]
+            total_waited += timing["waited"]
+            total_legacy += legacy
+            print(f"{step:<22}{timing['count']:>6}{timing['waited']:>14.2f}{legacy:>18.2f}{legacy - timing['waited']:>12.2f}")
+        print(f"{'total':<22}{'':>6}{total_waited:>14.2f}{total_legacy:>18.2f}{total_legacy - total_waited:>12.2f}")
+        print(f"Pauses de politesse: {self.pacer.total:.2f} s")
+        return {"waited": total_waited, "legacy": total_legacy, "paced": self.pacer.total}
+
     @staticmethod
     def extract_city_from_address(address):
         """Extrait la ville à partir de l'adresse en prenant ce qui suit la dernière virgule."""
@@ -59,13 +313,13 @@ class GoogleMapsScraper:
     def search_places(self, query):
         """Recherche des lieux sur Google Maps."""
         print(f"Recherche de: {query}")
-        self.driver.get("https://www.google.com/maps?hl=en")
+        self.driver.get(self.maps_url)
         
         # Accepter les cookies si nécessaire
         try:
             cookie_button = self.wait.until(EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Tout accepter')]")))
             cookie_button.click()
-            time.sleep(1)  # Réduit de 2s à 1s
+            self.wait_for("cookies", EC.invisibility_of_element(cookie_button))
         except:
             pass
         
@@ -74,14 +328,15 @@ class GoogleMapsScraper:
         search_box.clear()
         search_box.send_keys(query)
         search_box.send_keys(Keys.ENTER)
-        time.sleep(3)  # Réduit de 5s à 3s - juste assez pour charger les résultats
+        # Attendre les premiers résultats (ou la fiche directe d'un lieu unique)
+        self.wait_for("search_results", lambda d: self.count_elements("a.hfpxzc, h1") > 0)
         
     def extract_agency_links(self, max_agencies=100):
         """Extrait les liens vers les agences depuis les résultats de recherche."""
         agency_links = []
         agencies_found = 0
         scroll_attempts = 0
-        max_scroll_attempts = 30
+        max_scroll_attempts = LIST_END_ATTEMPTS
     
         try:
         # Wait for the results container to be present
@@ -110,14 +365,17 @@ class GoogleMapsScraper:
                     # Scroll to the last element to ensure new results load
                     if result_elements:
                         self.driver.execute_script("arguments[0].scrollIntoView(true);", result_elements[-1])
-                    time.sleep(random.uniform(1.0, 1.5))
-                
-                    # Check if we've reached the end
-                    new_elements = self.driver.find_elements(By.CSS_SELECTOR, "a.hfpxzc")
-                    if len(new_elements) == len(result_elements):
-                        scroll_attempts += 1
-                    else:
+
+                    # Attendre de nouveaux résultats ; sans nouveauté, on approche de la fin
+                    loaded = self.wait_for(
+                        "agency_links_scroll",
+                        lambda d: self.count_elements("a.hfpxzc") > len(result_elements),
+                        timeout=SCROLL_WAIT_TIMEOUT
+                    )
+                    if loaded:
                         scroll_attempts = 0
+                    else:
+                        scroll_attempts += 1
                 except Exception as e:
                     print(f"Erreur lors du défilement: {e}")
                     scroll_attempts += 1
@@ -190,7 +448,8 @@ class GoogleMapsScraper:
                 try:
                     reviews_button = self.wait.until(EC.element_to_be_clickable(locator))
                     reviews_button.click()
-                    time.sleep(1.5)  # Réduit de 3s à 1.5s
+                    # Attendre l'affichage des premiers avis
+                    self.wait_for("open_reviews", lambda d: self.count_elements("div.jftiEf.fontBodyMedium") > 0)
                     print(f"Bouton d'avis trouvé avec locator: {locator}")
                     return True
                 except:
@@ -202,6 +461,27 @@ class GoogleMapsScraper:
             print(f"Impossible d'accéder aux avis: {e}")
             return False
 
+    def sort_reviews_newest(self):
+        """Trie les avis du plus récent au plus ancien."""
+        try:
+            sort_button = self.wait.until(EC.element_to_be_clickable((
+                By.CSS_SELECTOR, "button[aria-label*='Sort'], button[data-value='Sort'], button[aria-label*='Trier']"
+            )))
+            first_cards = self.driver.find_elements(By.CSS_SELECTOR, "div.jftiEf.fontBodyMedium")[:1]
+            sort_button.click()
+            newest = self.wait.until(EC.element_to_be_clickable((
+                By.XPATH, "//div[@role='menuitemradio'][contains(., 'Newest') or contains(., 'Plus récents')]"
+            )))
+            newest.click()
+            # Le fil des avis est rechargé : attendre que l'ancienne première carte disparaisse
+            if first_cards:
+                self.wait_for("sort_reviews", EC.staleness_of(first_cards[0]))
+            self.wait_for("sort_reviews", lambda d: self.count_elements("div.jftiEf.fontBodyMedium") > 0)
+            return True
+        except Exception as e:
+            print(f"Impossible de trier les avis par date: {e}")
+            return False
+
     def scroll_reviews(self, target_reviews=100, max_attempts=30):
         """Fait défiler la page des avis pour en charger davantage. Réduit le nombre maximum de tentatives."""
         reviews_collected = 0
@@ -232,8 +512,13 @@ class GoogleMapsScraper:
                 last_height = self.driver.execute_script("return arguments[0].scrollHeight", scrollable_div)
                 self.driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", scrollable_div)
                 
-                # Wait for new reviews to load - temps réduit
-                time.sleep(random.uniform(0.8, 1.2))
+                # Attendre que de nouveaux avis arrivent (ou que la liste s'allonge)
+                self.wait_for(
+                    "scroll_reviews",
+                    lambda d: self.count_elements("div.jftiEf.fontBodyMedium") > reviews_collected
+                        or d.execute_script("return arguments[0].scrollHeight", scrollable_div) > last_height,
+                    timeout=SCROLL_WAIT_TIMEOUT
+                )
                 
                 # Check number of reviews after scrolling
                 current_reviews = len(self.driver.find_elements(By.CSS_SELECTOR, "div.jftiEf.fontBodyMedium"))
@@ -254,10 +539,35 @@ class GoogleMapsScraper:
             except Exception as e:
                 print(f"Scrolling error: {e}")
                 attempts += 1
-                time.sleep(random.uniform(1, 2))
+                # Reprise après erreur, indépendante des pauses de politesse (Pacer)
+                time.sleep(min(SCROLL_RETRY_DELAY * 2 ** (attempts - 1), SCROLL_RETRY_MAX_DELAY))
         
         return reviews_collected
 
+    def scroll_and_expand(self, target_reviews=100, timeout=300, idle=SCROLL_WAIT_TIMEOUT):
+        """Charge et déplie les avis dans la page, en un seul appel execute_async_script.
+
+        Returns:
+            dict: nombre d'avis chargés, boutons dépliés, raison de l'arrêt
+                ("target", "end", "timeout") et progression (ms, nombre d'avis),
+                ou None si le fil des avis est introuvable
+        """
+        self.driver.set_script_timeout(timeout + 10)
+        start = time.perf_counter()
+        try:
+            report = self.driver.execute_async_script(SCROLL_AND_EXPAND_JS, target_reviews, timeout * 1000, idle * 1000)
+        finally:
+            self.timings["scroll_and_expand"]["count"] += 1
+            self.timings["scroll_and_expand"]["waited"] += time.perf_counter() - start
+
+        if report.get("error"):
+            print(f"Défilement dans la page impossible: {report['error']}")
+            return None
+        steps = ", ".join(f"{p['count']}@{p['ms'] / 1000:.1f}s" for p in report["progress"])
+        print(f"Reviews collected: {report['count']} ({report['reason']}), "
+              f"{report['expanded']} avis dépliés - progression: {steps}")
+        return report
+
     def expand_reviews(self):
         """Développe tous les avis pour voir le texte complet."""
         try:
@@ -265,15 +575,59 @@ class GoogleMapsScraper:
             more_buttons = self.driver.find_elements(By.XPATH, "//button[contains(@jsaction, 'pane.review.expandReview')]")
             for button in more_buttons:
                 try:
+                    # Le clic JavaScript est synchrone : pas de pause entre deux boutons
                     self.driver.execute_script("arguments[0].click();", button)
-                    time.sleep(random.uniform(0.1, 0.2))  # Réduit de 0.2-0.5s à 0.1-0.2s
                 except StaleElementReferenceException:
                     continue
+            self.timings["expand_reviews"]["count"] += len(more_buttons)
         except Exception as e:
             print(f"Erreur lors de l'expansion des avis: {e}")
 
-    def extract_reviews(self, target_reviews=30):
-        """Extrait tous les avis visibles."""
+    def extract_reviews(self, target_reviews=30, mode="script"):
+        """Extrait tous les avis visibles.
+
+        En mode "script", toutes les cartes d'avis sont lues en un seul appel
+        execute_script. Si le script échoue ou ne trouve rien (sélecteurs
+        modifiés), on revient à l'extraction élément par élément.
+        """
+        if mode == "script":
+            try:
+                reviews = self.extract_reviews_script(target_reviews)
+                if reviews:
+                    print(f"Nombre total d'avis extraits : {len(reviews)}")
+                    return reviews
+                print("Extraction par script vide, extraction élément par élément")
+            except Exception as e:
+                print(f"Erreur de l'extraction par script ({e}), extraction élément par élément")
+        return self.extract_reviews_elements(target_reviews)
+
+    def extract_reviews_script(self, target_reviews=30):
+        """Lit utilisateur, note, date et texte de chaque carte d'avis en un seul aller-retour."""
+        cards = self.driver.execute_script(EXTRACT_REVIEWS_JS, target_reviews)
+        reviews = []
+        for card in cards:
+            # Comme l'extraction élément par élément : carte sans nom ou sans date ignorée
+            if card["user_name"] is None or card["date"] is None:
+                continue
+            reviews.append({
+                "user_name": card["user_name"],
+                "rating": self.parse_rating(card["rating_label"]),
+                "date": card["date"],
+                "text": card["text"]
+            })
+        return reviews
+
+    @staticmethod
+    def parse_rating(rating_text):
+        """Convertit l'aria-label de la note ("4 stars", "4,0 étoiles") en float, 1.0 par défaut."""
+        if rating_text:
+            rating_match = re.search(r'(\d+(?:[.,]\d+)?)', rating_text)
+            if rating_match:
+                return float(rating_match.group(1).replace(',', '.'))
+        return 1.0
+
+    def extract_reviews_elements(self, target_reviews=30):
+        """Extrait les avis élément par élément (plusieurs appels WebDriver par avis)."""
         reviews = []
         try:
             # Get fresh review elements each time to avoid staleness
@@ -332,30 +686,110 @@ class GoogleMapsScraper:
             print(f"Erreur lors de l'extraction des avis: {e}")
             return []
 
-    def scrape_agency(self, agency_link, target_reviews=100):
-        """Scrape une agence spécifique: détails et avis."""
+    def load_reviews(self, target_reviews=100, in_page=True):
+        """Charge et déplie les avis affichés jusqu'à target_reviews."""
+        report = None
+        if in_page:
+            try:
+                report = self.scroll_and_expand(target_reviews)
+            except Exception as e:
+                print(f"Erreur du défilement dans la page: {e}")
+
+        if report is None:
+            # Scroll to load more reviews
+            self.scroll_reviews(target_reviews)
+            
+            # Expand reviews to see full text
+            self.expand_reviews()
+
+    def scrape_new_reviews(self, place_details, target_reviews=100, in_page=True):
+        """Mode incrémental : avis triés par date, arrêt au premier avis déjà vu.
+
+        Returns:
+            (list, list | None): nouveaux avis, et leurs empreintes du plus récent
+            au plus ancien (None si le tri a échoué : le repère n'est pas mis à jour)
+        """
+        seen = self.watermarks.seen(agency_key(place_details))
+
+        if not self.sort_reviews_newest():
+            print("Scraping complet de l'agence, seuls les avis inconnus sont gardés")
+            self.load_reviews(target_reviews, in_page)
+            reviews = self.extract_reviews(target_reviews)
+            return [r for r in reviews if review_fingerprint(r) not in seen], None
+
+        # Première visite : pas de repère, chargement direct de tous les avis demandés
+        goal = min(INCREMENTAL_BATCH, target_reviews) if seen else target_reviews
+        while True:
+            self.load_reviews(goal, in_page)
+            reviews = self.extract_reviews(goal)
+
+            new_reviews = []
+            reached = False
+            for review in reviews:
+                if review_fingerprint(review) in seen:
+                    reached = True
+                    break
+                new_reviews.append(review)
+
+            # Repère atteint, fin de la liste ou limite demandée
+            if reached or len(reviews) < goal or goal >= target_reviews:
+                break
+            goal = min(goal + INCREMENTAL_BATCH, target_reviews)
+
+        print(f"{len(new_reviews)} nouveaux avis" + (" (repère atteint)" if reached else ""))
+        return new_reviews, [review_fingerprint(r) for r in new_reviews]
+
+    def scrape_agency(self, agency_link, target_reviews=100, in_page=True, incremental=None):
+        """Scrape une agence spécifique: détails et avis (mesuré dans l'étape "scrape_agency").
+
+        Voir _scrape_agency.
+        """
+        calls = self.webdriver_calls
+        with self.metrics.stage("scrape_agency") as stage:
+            result = self._scrape_agency(agency_link, target_reviews, in_page, incremental)
+            stage.items = len(result["reviews"])
+            stage.calls = self.webdriver_calls - calls
+        return result
+
+    def _scrape_agency(self, agency_link, target_reviews=100, in_page=True, incremental=None):
+        """Scrape une agence spécifique: détails et avis.
+
+        in_page: défilement et dépliage des avis par un script dans la page
+        (quelques allers-retours WebDriver), avec repli sur le défilement piloté
+        depuis Python si le script échoue.
+        incremental: ne garder que les avis plus récents que le repère de l'agence
+        (par défaut, le mode du scraper). Les empreintes des nouveaux avis sont
+        renvoyées sous "watermark" ; commit_result les enregistre.
+        """
+        incremental = self.incremental if incremental is None else incremental
         try:
             print(f"Accès à l'agence: {agency_link}")
             self.driver.get(agency_link)
-            time.sleep(2)  # Réduit de 5s à 2s
+            # Attendre le nom de l'agence plutôt qu'une pause fixe
+            self.wait_for("open_agency", lambda d: self.count_elements("h1") > 0)
             
             place_details = self.get_place_details()
             
             all_reviews = []
+            watermark = None
             if self.click_on_reviews():
-                # Scroll to load more reviews
-                collected_reviews = self.scroll_reviews(target_reviews)
-                
-                # Expand reviews to see full text
-                self.expand_reviews()
-                
-                # Extract reviews
-                all_reviews = self.extract_reviews(target_reviews)
+                if incremental and self.watermarks is not None:
+                    all_reviews, watermark = self.scrape_new_reviews(place_details, target_reviews, in_page)
+                else:
+                    self.load_reviews(target_reviews, in_page)
+                    
+                    # Extract reviews
+                    all_reviews = self.extract_reviews(target_reviews)
             
-            return {
+            result = {
                 "place_details": place_details,
-                "reviews": all_reviews
+                "reviews": all_reviews,
+                # Les dates des avis sont relatives ("3 weeks ago") : on garde l'heure du scraping
+                "scraped_at": datetime.datetime.now().isoformat(timespec="seconds")
             }
+            if watermark is not None:
+                result["watermark"] = watermark
+            return result
         except Exception as e:
             print(f"Erreur lors du scraping de l'agence: {e}")
             return {
@@ -363,20 +797,48 @@ class GoogleMapsScraper:
                 "reviews": []
             }
     
-    def scrape_all_cih_agencies(self, reviews_per_agency=5000, max_agencies=5000):
-        """Recherche et scrape toutes les agences CIH Bank au Maroc."""
-        # Recherche des agences CIH Bank au Maroc
-        self.search_places("cih banque maroc")
-        
-        # Extraire les liens vers toutes les agences
-        agency_links = self.extract_agency_links(max_agencies)
-        
-        # Tableau pour stocker tous les résultats
-        all_results = []
-        all_reviews = []
+    @classmethod
+    def add_place_info(cls, result):
+        """Ajoute le nom, l'adresse, la ville de l'agence et l'heure du scraping à chacun de ses avis."""
+        place_name = result["place_details"]["name"]
+        place_address = result["place_details"]["address"]
+        scraped_at = result.get("scraped_at")
+        for review in result["reviews"]:
+            review["place_name"] = place_name
+            review["place_address"] = place_address
+            review["city"] = cls.extract_city_from_address(place_address)
+            review["scraped_at"] = scraped_at
+        return result["reviews"]
+
+    def scrape_all_cih_agencies(self, reviews_per_agency=5000, max_agencies=5000, journal=None, spool=None):
+        """Recherche et scrape toutes les agences CIH Bank au Maroc.
+
+        Chaque agence est ajoutée au journal de crawl dès qu'elle est scrapée :
+        après un arrêt, une nouvelle exécution reprend là où la précédente
+        s'est arrêtée. Avec un spool (ReviewSpool), chaque agence est aussi
+        transmise au transform, qui la traite pendant la suite du scraping.
+
+        Returns:
+            int: nombre d'agences du fichier final (resultats_cih_banque_final.json)
+        """
+        if journal is None:
+            journal = CrawlJournal(save_folder)
+
+        calls = self.webdriver_calls
+        with self.metrics.stage("search_agencies") as stage:
+            # Recherche des agences CIH Bank au Maroc
+            self.search_places("cih banque maroc")
+            
+            # Extraire les liens vers toutes les agences
+            agency_links = self.extract_agency_links(max_agencies)
+            stage.items = len(agency_links)
+            stage.calls = self.webdriver_calls - calls
         
         # Scraper chaque agence une par une
         for i, link in enumerate(agency_links):
+            if journal.is_done(link):
+                print(f"Agence {i+1}/{len(agency_links)} déjà scrapée, ignorée")
+                continue
             print(f"\n======= Scraping de l'agence {i+1}/{len(agency_links)} =======")
             try:
                 # Scraper l'agence
@@ -384,59 +846,90 @@ class GoogleMapsScraper:
                 
                 # Ne sauvegarder que si on a des résultats valides
                 if result["place_details"]["name"] != "Erreur":
-                    all_results.append(result)
-                    
-                    # Ajouter les avis au dataframe
-                    place_name = result["place_details"]["name"]
-                    place_address = result["place_details"]["address"]
-                    for review in result["reviews"]:
-                        review["place_name"] = place_name
-                        review["place_address"] = place_address
-                        review["city"] = self.extract_city_from_address(place_address)
-                        all_reviews.append(review)
+                    commit_result(journal, self.watermarks, i, link, result, spool)
                 
                 # Pause aléatoire entre les requêtes pour éviter les blocages
                 # Cette pause est critique pour éviter d'être banni - gardée plus longue
-                time.sleep(random.uniform(1.5, 3))
-                
-                # Nettoyer le nom du fichier
-                safe_place_name = GoogleMapsScraper.sanitize_filename(result["place_details"]["name"])
-
-                # Sauvegarde JSON avec nom nettoyé
-                with open(os.path.join(save_folder, f"resultats_cih_agences_{i+1}_{safe_place_name}.json"), 'w', encoding='utf-8') as f:
-                    json.dump(all_results, f, ensure_ascii=False, indent=4)
-
-                # CSV avec les avis
-                #if all_reviews:
-                #    df = pd.DataFrame(all_reviews)
-                #    df.to_csv(os.path.join(save_folder, f"avis_cih_banque_{i+1}_{safe_place_name}.csv"), index=False, encoding='utf-8')
+                self.pacer.pace()
                 
             except Exception as e:
                 print(f"Erreur lors du scraping de l'agence {i+1}: {e}")
         
-        # Sauvegarde finale de tous les résultats
-        with open(os.path.join(save_folder, "resultats_cih_banque_final.json"), 'w', encoding='utf-8') as f:
-            json.dump(all_results, f, ensure_ascii=False, indent=4)
-        
-        # Création d'un DataFrame final pour analyse
-        if all_reviews:
-            final_df = pd.DataFrame(all_reviews)
-            final_df.to_csv(os.path.join(save_folder, "avis_cih_banque_final.csv"), index=False, encoding='utf-8')
-        
-        return all_results
+        self.timing_report()
+        if spool is not None:
+            spool.close()
+        with self.metrics.stage("finalize_crawl") as stage:
+            stage.items = finalize_crawl(journal, spool)
+        finish_run(self.metrics_run)
+        return stage.items
     
+    @property
+    def metrics(self):
+        """Mesures de l'exécution en cours (une nouvelle exécution commence après finish_run)."""
+        return get_run(self.metrics_run)
+
     def close(self):
         """Ferme le navigateur."""
         self.driver.quit()
 
-def scraper():
+def commit_result(journal, watermarks, index, link, result, spool=None):
+    """Enregistre une agence scrapée dans le journal, puis met à jour son repère incrémental.
+
+    Le repère n'avance qu'une fois les avis écrits dans le journal : un arrêt
+    entre les deux ne fait pas perdre d'avis. Avec un spool, l'agence est
+    aussi transmise au transform avant d'être journalisée (un arrêt entre les
+    deux la renvoie une seconde fois, sans doublon dans l'entrepôt).
+    """
+    watermark = result.pop("watermark", None)
+    GoogleMapsScraper.add_place_info(result)
+    if spool is not None:
+        waited = spool.put(result)
+        if waited:
+            print(f"Transform en retard : scraping en attente pendant {waited:.0f}s")
+    journal.record(index, link, result)
+    if watermarks is not None and watermark:
+        watermarks.update(agency_key(result["place_details"]), watermark)
+
+def finalize_crawl(journal, spool=None):
+    """Assemble les fichiers finaux (JSON et CSV des avis) depuis le journal, puis clôt le crawl.
+
+    Avec un spool qu'aucun transform n'a lu pendant le scraping, les segments
+    sont supprimés : le transform lira le fichier final, et non la file.
+    """
+    n_agencies = journal.assemble(os.path.join(save_folder, "resultats_cih_banque_final.json"))
+
+    # Création du CSV final des avis, une agence à la fois
+    csv_path = os.path.join(save_folder, "avis_cih_banque_final.csv")
+    first = True
+    for result in journal.iter_results():
+        if result["reviews"]:
+            pd.DataFrame(result["reviews"]).to_csv(
+                csv_path + ".tmp", mode="w" if first else "a", header=first, index=False, encoding='utf-8'
+            )
+            first = False
+    if not first:
+        os.replace(csv_path + ".tmp", csv_path)
+
+    journal.finish()
+    if spool is not None and not spool.consumer_seen():
+        discarded = spool.discard()
+        if discarded:
+            print(f"Spool: aucun transform n'a lu la file, {discarded} segments supprimés")
+    print(f"Fichiers finaux écrits: {n_agencies} agences")
+    return n_agencies
+
+def scraper(spool_dir=None, run_id=None):
+    """Tâche d'extraction ; avec spool_dir, à lancer en même temps que transformer(spool_dir=..., run_id=...)."""
     # Réduit les temps d'attente implicite et explicite
     scraper = GoogleMapsScraper(implicit_wait=10, explicit_wait=10)
+    spool = ReviewSpool(spool_dir, run_id=run_id) if spool_dir else None
+    if spool is not None:
+        spool.start()
     try:
         print("Démarrage du scraping des agences CIH Bank au Maroc")
         # Ajustez ces paramètres selon vos besoins
-        results = scraper.scrape_all_cih_agencies(reviews_per_agency=20, max_agencies=3)
-        print(f"Extraction terminée. {len(results)} agences analysées.")
+        n_agencies = scraper.scrape_all_cih_agencies(reviews_per_agency=20, max_agencies=3, spool=spool)
+        print(f"Extraction terminée. {n_agencies} agences analysées.")
     except Exception as e:
         print(f"Erreur lors du scraping: {e}")
     finally:
@@ -0,0 +1,263 @@
+import os
+import sys
+import time
+import queue
+import random
+import multiprocessing as mp
+from collections import deque
+
+from google_maps_scraper import GoogleMapsScraper, save_folder, commit_result, finalize_crawl, MAPS_URL, WATERMARKS_PATH
+from review_watermark import ReviewWatermarks
+from crawl_journal import CrawlJournal
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+from run_metrics import get_run, finish_run
+from review_spool import ReviewSpool
+
+
+def _scraper_worker(worker_id, tasks, results, scraper_kwargs, target_reviews, min_interval, jitter,
+                    session_agencies=None):
+    """Processus de scraping : un navigateur dédié, réutilisé pour toutes ses agences.
+
+    Le rythme est limité par worker : au moins min_interval secondes (plus un
+    délai aléatoire entre 0 et jitter) entre deux agences. Avec session_agencies,
+    la session (cookies, stockage) est vidée toutes les session_agencies agences,
+    sans relancer le navigateur.
+    """
+    scraper = None
+    last_start = None
+    scraped = 0
+    try:
+        scraper = GoogleMapsScraper(**dict(scraper_kwargs, metrics_run=f"extract_worker{worker_id}"))
+        results.put(("ready", worker_id, None, None, None))
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            index, link = task
+
+            if last_start is not None:
+                delay = min_interval + random.uniform(0, jitter) - (time.monotonic() - last_start)
+                if delay > 0:
+                    time.sleep(delay)
+            last_start = time.monotonic()
+
+            if session_agencies and scraped and scraped % session_agencies == 0:
+                scraper.reset_session()
+            scraped += 1
+
+            try:
+                result = scraper.scrape_agency(link, target_reviews)
+                if result["place_details"]["name"] == "Erreur":
+                    results.put(("failed", worker_id, index, None, "détails de l'agence introuvables"))
+                else:
+                    results.put(("done", worker_id, index, result, None))
+            except Exception as e:
+                results.put(("failed", worker_id, index, None, str(e)))
+    except Exception as e:
+        results.put(("dead", worker_id, None, None, str(e)))
+    finally:
+        if scraper is not None:
+            scraper.close()
+            # Un rapport de mesures par worker (étape scrape_agency, appels WebDriver)
+            finish_run(scraper.metrics_run)
+
+
+class ParallelScraper:
+    """Répartit les agences entre plusieurs navigateurs indépendants (un processus chacun).
+
+    Une agence en échec est relancée sur un autre worker (jusqu'à max_retries
+    fois). Les résultats sont fusionnés dans l'ordre des liens, quel que soit
+    l'ordre d'arrivée.
+    """
+
+    def __init__(self, n_workers=3, min_interval=3.0, jitter=2.0, max_retries=2,
+                 scraper_kwargs=None, worker_timeout=600, session_agencies=None):
+        self.n_workers = n_workers
+        self.session_agencies = session_agencies
+        self.min_interval = min_interval
+        self.jitter = jitter
+        self.max_retries = max_retries
+        self.scraper_kwargs = scraper_kwargs or {}
+        self.worker_timeout = worker_timeout
+
+    def scrape(self, agency_links, target_reviews=100, journal=None, watermarks=None, spool=None):
+        """Scrape toutes les agences de agency_links.
+
+        Avec un journal, les agences déjà terminées sont sautées et chaque
+        résultat y est enregistré dès son arrivée (et le repère incrémental de
+        l'agence mis à jour si watermarks est fourni, et l'agence transmise au
+        transform si spool est fourni). Les résultats ne sont pas gardés en
+        mémoire : finalize_crawl assemble le fichier final depuis le journal.
+
+        Returns:
+            dict: nombre d'avis de chaque agence scrapée, par indice dans agency_links
+        """
+        pending = deque(i for i, link in enumerate(agency_links) if journal is None or not journal.is_done(link))
+        ctx = mp.get_context("spawn")
+        results = ctx.Queue()
+        workers = {}
+        for worker_id in range(min(self.n_workers, len(pending))):
+            tasks = ctx.Queue()
+            process = ctx.Process(
+                target=_scraper_worker,
+                args=(worker_id, tasks, results, self.scraper_kwargs, target_reviews,
+                      self.min_interval, self.jitter, self.session_agencies),
+                daemon=True
+            )
+            process.start()
+            workers[worker_id] = {"process": process, "tasks": tasks}
+
+        tried_on = {index: set() for index in pending}   # workers déjà essayés par agence
+        attempts = {index: 0 for index in pending}
+        in_flight = {}                                   # worker_id -> (index, heure de début)
+        idle = set()
+        done = {}                                        # index -> nombre d'avis
+
+        try:
+            while (pending or in_flight) and workers:
+                self._dispatch(agency_links, pending, tried_on, in_flight, idle, workers)
+                try:
+                    status, worker_id, index, result, error = results.get(timeout=5)
+                except queue.Empty:
+                    self._reap(pending, attempts, in_flight, idle, workers)
+                    continue
+
+                if worker_id not in workers:
+                    # Message tardif d'un worker déjà retiré : accepté s'il arrive avant la relance
+                    if status == "done" and index not in done:
+                        self._commit(journal, watermarks, index, agency_links[index], result, spool)
+                        done[index] = len(result["reviews"])
+                        if index in pending:
+                            pending.remove(index)
+                    continue
+
+                if status == "ready":
+                    idle.add(worker_id)
+                elif status == "dead":
+                    print(f"Worker {worker_id} arrêté: {error}")
+                    self._drop_worker(worker_id, pending, attempts, in_flight, idle, workers)
+                elif status == "done":
+                    in_flight.pop(worker_id, None)
+                    idle.add(worker_id)
+                    if index in done:
+                        # Relance d'une agence déjà acceptée depuis un worker retiré
+                        continue
+                    self._commit(journal, watermarks, index, agency_links[index], result, spool)
+                    done[index] = len(result["reviews"])
+                    print(f"[worker {worker_id}] agence {index+1}/{len(agency_links)}: "
+                          f"{done[index]} avis ({len(done)} terminées)")
+                else:
+                    in_flight.pop(worker_id, None)
+                    idle.add(worker_id)
+                    tried_on[index].add(worker_id)
+                    attempts[index] += 1
+                    print(f"[worker {worker_id}] échec de l'agence {index+1} ({error})")
+                    if attempts[index] <= self.max_retries:
+                        pending.append(index)
+        finally:
+            for worker in workers.values():
+                worker["tasks"].put(None)
+            for worker in workers.values():
+                worker["process"].join(timeout=30)
+                if worker["process"].is_alive():
+                    worker["process"].terminate()
+
+        failed = [agency_links[i] for i in tried_on if i not in done]
+        if failed:
+            print(f"{len(failed)} agences non scrapées: {failed}")
+        return done
+
+    @staticmethod
+    def _commit(journal, watermarks, index, link, result, spool=None):
+        if journal is not None:
+            commit_result(journal, watermarks, index, link, result, spool)
+        else:
+            result.pop("watermark", None)
+            GoogleMapsScraper.add_place_info(result)
+            if spool is not None:
+                spool.put(result)
+
+    def _dispatch(self, agency_links, pending, tried_on, in_flight, idle, workers):
+        """Attribue les agences en attente aux workers libres, en évitant ceux déjà en échec."""
+        for _ in range(len(pending)):
+            if not idle:
+                return
+            index = pending.popleft()
+            candidates = idle - tried_on[index]
+            if not candidates and not (set(workers) - tried_on[index]):
+                # Tous les workers ont déjà échoué sur cette agence : n'importe lequel
+                candidates = idle
+            if not candidates:
+                pending.append(index)
+                continue
+            worker_id = min(candidates)
+            idle.discard(worker_id)
+            in_flight[worker_id] = (index, time.monotonic())
+            workers[worker_id]["tasks"].put((index, agency_links[index]))
+
+    def _reap(self, pending, attempts, in_flight, idle, workers):
+        """Retire les workers morts ou bloqués et remet leur agence en file."""
+        now = time.monotonic()
+        for worker_id, worker in list(workers.items()):
+            started = in_flight.get(worker_id, (None, now))[1]
+            if not worker["process"].is_alive() or now - started > self.worker_timeout:
+                print(f"Worker {worker_id} ne répond plus, arrêt")
+                self._drop_worker(worker_id, pending, attempts, in_flight, idle, workers)
+
+    def _drop_worker(self, worker_id, pending, attempts, in_flight, idle, workers):
+        worker = workers.pop(worker_id)
+        if worker["process"].is_alive():
+            worker["process"].terminate()
+        idle.discard(worker_id)
+        if worker_id in in_flight:
+            index, _ = in_flight.pop(worker_id)
+            attempts[index] += 1
+            if attempts[index] <= self.max_retries:
+                pending.append(index)
+
+
+def scrape_all_cih_agencies_parallel(n_workers=3, reviews_per_agency=5000, max_agencies=5000,
+                                     maps_url=MAPS_URL, incremental=False, spool_dir=None, run_id=None,
+                                     **scheduler_kwargs):
+    """Recherche les agences avec un navigateur puis les scrape en parallèle (crawl reprenable).
+
+    spool_dir: transmet chaque agence au transform dès qu'elle est scrapée (voir ReviewSpool),
+    run_id: identifiant de l'exécution partagé avec le transform.
+
+    Returns:
+        int: nombre d'agences du fichier final (resultats_cih_banque_final.json)
+    """
+    journal = CrawlJournal(save_folder)
+    spool = ReviewSpool(spool_dir, run_id=run_id) if spool_dir else None
+    if spool is not None:
+        spool.start()
+    watermarks = ReviewWatermarks(WATERMARKS_PATH) if incremental else None
+    scraper_kwargs = {"maps_url": maps_url, "incremental": incremental}
+    metrics = get_run("extract")
+    finder = GoogleMapsScraper(maps_url=maps_url)
+    try:
+        with metrics.stage("search_agencies") as stage:
+            finder.search_places("cih banque maroc")
+            agency_links = finder.extract_agency_links(max_agencies)
+            stage.items = len(agency_links)
+            stage.calls = finder.webdriver_calls
+    finally:
+        finder.close()
+
+    with metrics.stage("parallel_scrape") as stage:
+        review_counts = ParallelScraper(n_workers, scraper_kwargs=scraper_kwargs, **scheduler_kwargs) \
+            .scrape(agency_links, reviews_per_agency, journal=journal, watermarks=watermarks, spool=spool)
+        stage.items = sum(review_counts.values())
+
+    if spool is not None:
+        spool.close()
+    with metrics.stage("finalize_crawl") as stage:
+        stage.items = finalize_crawl(journal, spool)
+    finish_run("extract")
+    return stage.items
+
+
+if __name__ == "__main__":
+    n_agencies = scrape_all_cih_agencies_parallel(n_workers=3, reviews_per_agency=20, max_agencies=6)
+    print(f"Extraction terminée. {n_agencies} agences analysées.")
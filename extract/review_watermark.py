@@ -0,0 +1,52 @@
+import os
+import json
+import hashlib
+
+
+def review_fingerprint(review):
+    """Empreinte stable d'un avis : hash de l'utilisateur et du texte.
+
+    La date n'en fait pas partie : Google l'affiche en relatif ("3 weeks ago"),
+    elle change d'un scraping à l'autre pour un même avis.
+    """
+    payload = "\x1f".join([review.get("user_name") or "", review.get("text") or ""])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def agency_key(place_details):
+    """Identifie une agence par son nom et son adresse (les liens Maps varient)."""
+    return f"{place_details.get('name', '')}|{place_details.get('address', '')}"
+
+
+class ReviewWatermarks:
+    """Empreintes des avis les plus récents déjà vus, par agence.
+
+    On garde les `keep` dernières empreintes (et pas une seule) pour rester
+    robuste à la suppression ou à la modification de l'avis le plus récent.
+    """
+
+    def __init__(self, path, keep=50):
+        self.path = path
+        self.keep = keep
+        self.marks = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.marks = json.load(f)
+
+    def seen(self, key):
+        return set(self.marks.get(key, []))
+
+    def update(self, key, newest_fingerprints):
+        """Ajoute les empreintes des nouveaux avis (du plus récent au plus ancien) et sauvegarde."""
+        if not newest_fingerprints:
+            return
+        merged = list(newest_fingerprints)
+        merged += [fp for fp in self.marks.get(key, []) if fp not in set(newest_fingerprints)]
+        self.marks[key] = merged[:self.keep]
+        self.save()
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.marks, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -1,34 +1,692 @@
 from sqlalchemy import create_engine
 import pandas as pd
+import numpy as np
+import hashlib
+import json
+import io
+import os
+import sys
+import time
 
-def load_tosql(**kwargs):
-    # Retrieve the transformed data from the previous task
-    transformed_data = kwargs['ti'].xcom_pull(task_ids='transform_task')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+from run_metrics import get_run, finish_run, peak_rss_bytes
+from file_digest import file_sha256
+
+# Connexion à l'entrepôt PostgreSQL (surchargeable pour tester sur une base locale).
+# Pilote psycopg2 explicite : COPY passe par cursor.copy_expert
+DW_URL = os.environ.get("CIH_DW_URL", "postgresql+psycopg2://data_analyst:0@localhost:5432/bank_reviews_dw")
+
+# Chargement d'un fichier de résultats par lots de LOAD_BATCH_ROWS avis (une transaction par lot)
+LOAD_BATCH_ROWS = 50000
+
+# Dimensions : clé de substitution entière, clé naturelle unique et attributs
+DIMENSIONS = {
+    "dim_agency": {
+        "ddl": "agency_id serial PRIMARY KEY, place_address text UNIQUE NOT NULL, city text",
+        "id": "agency_id",
+        "key": "place_address",
+        "attributes": ["city"]
+    },
+    "dim_date": {
+        "ddl": "date_id serial PRIMARY KEY, date date UNIQUE NOT NULL, day integer, month integer, year integer",
+        "id": "date_id",
+        "key": "date",
+        "attributes": ["day", "month", "year"]
+    },
+    "dim_topics": {
+        # topic : "<version du modèle>/Sujet i" (un réajustement du modèle donne de nouvelles lignes),
+        # ou "Sujet i" pour les résultats sans version
+        "ddl": "topic_id serial PRIMARY KEY, topic text UNIQUE NOT NULL, words text, label text, model_version text",
+        "id": "topic_id",
+        "key": "topic",
+        "attributes": ["words", "label", "model_version"],
+        # Colonnes ajoutées aux tables créées auparavant
+        "added_columns": ["label text", "model_version text"]
+    },
+    "dim_terms": {
+        "ddl": "term_id serial PRIMARY KEY, term text UNIQUE NOT NULL",
+        "id": "term_id",
+        "key": "term",
+        "attributes": []
+    }
+}
+
+# Table de faits : clés étrangères entières et identifiant stable de l'avis
+FACT = {
+    "table": "reviews",
+    "ddl": (
+        "review_id bigint PRIMARY KEY, "
+        "agency_id integer REFERENCES dim_agency (agency_id), "
+        "date_id integer REFERENCES dim_date (date_id), "
+        "topic_id integer REFERENCES dim_topics (topic_id), "
+        "review text, sentiment text, score double precision"
+    ),
+    "columns": ["review_id", "agency_id", "date_id", "topic_id", "review", "sentiment", "score"],
+    "key": "review_id"
+}
+
+# Pont avis <-> termes d'aspect (nuage de mots, principaux thèmes), nombre de mentions par avis
+REVIEW_TERMS = {
+    "table": "review_terms",
+    "ddl": (
+        "review_id bigint REFERENCES reviews (review_id) ON DELETE CASCADE, "
+        "term_id integer REFERENCES dim_terms (term_id), mentions integer NOT NULL, "
+        "PRIMARY KEY (review_id, term_id)"
+    ),
+    "columns": ["review_id", "term_id", "mentions"]
+}
+
+# Agrégats lus par les tableaux de bord, tenus à jour à chaque chargement à partir
+# des avis ajoutés ou modifiés (f : avis signés +1 / -1, a : dim_agency, d : dim_date)
+AGGREGATES = {
+    "agg_sentiment_monthly": {
+        "ddl": (
+            "agency_id integer NOT NULL REFERENCES dim_agency (agency_id), city text, "
+            "month date NOT NULL, sentiment text NOT NULL, "
+            "reviews bigint NOT NULL, scored bigint NOT NULL, score_sum double precision NOT NULL, "
+            "PRIMARY KEY (agency_id, month, sentiment)"
+        ),
+        "groups": {
+            "agency_id": "f.agency_id",
+            "city": "a.city",
+            "month": "date_trunc('month', d.date)::date",
+            "sentiment": "f.sentiment"
+        },
+        "key": ["agency_id", "month", "sentiment"],
+        "measures": {
+            "reviews": "SUM(f.sign)",
+            "scored": "SUM(f.sign) FILTER (WHERE f.score IS NOT NULL)",
+            "score_sum": "SUM(f.sign * f.score)"
+        },
+        "where": "f.sentiment IS NOT NULL"
+    },
+    "agg_topic_monthly": {
+        "ddl": (
+            "agency_id integer NOT NULL REFERENCES dim_agency (agency_id), "
+            "month date NOT NULL, sentiment text NOT NULL, "
+            "topic_id integer NOT NULL REFERENCES dim_topics (topic_id), reviews bigint NOT NULL, "
+            "PRIMARY KEY (agency_id, month, sentiment, topic_id)"
+        ),
+        "groups": {
+            "agency_id": "f.agency_id",
+            "month": "date_trunc('month', d.date)::date",
+            "sentiment": "f.sentiment",
+            "topic_id": "f.topic_id"
+        },
+        "key": ["agency_id", "month", "sentiment", "topic_id"],
+        "measures": {"reviews": "SUM(f.sign)"},
+        "where": "f.sentiment IS NOT NULL AND f.topic_id IS NOT NULL"
+    }
+}
+
+# Colonnes des faits dont dépendent les agrégats
+AGGREGATED_COLUMNS = ["agency_id", "date_id", "topic_id", "sentiment", "score"]
+
+# Écart toléré sur les sommes de scores (ajouts / retraits successifs en double précision)
+AGGREGATE_TOLERANCE = 1e-6
+
+# Attributs des dimensions qui peuvent changer d'une exécution à l'autre (mots des topics)
+MUTABLE_DIMENSIONS = {"dim_topics"}
+
+_engines = {}
+
+
+def get_engine(url=DW_URL):
+    """Moteur SQLAlchemy partagé : le pool de connexions est réutilisé d'un appel à l'autre.
+
+    Une URL sans pilote ("postgresql://") utilise psycopg2 : avec SQLAlchemy 2,
+    elle pourrait désigner psycopg 3. psycopg 3 reste utilisable en le
+    demandant explicitement ("postgresql+psycopg://").
+    """
+    if url not in _engines:
+        _engines[url] = create_engine(_with_driver(url), pool_size=2, pool_pre_ping=True)
+    return _engines[url]
+
+
+def _with_driver(url):
+    for scheme in ("postgresql://", "postgres://"):
+        if url.startswith(scheme):
+            return "postgresql+psycopg2://" + url[len(scheme):]
+    return url
+
+
+def review_id(place_address, user_name, text):
+    """Identifiant stable (bigint) d'un avis ; la date relative change d'un scraping à l'autre."""
+    payload = "\x1f".join("" if pd.isna(v) else str(v) for v in (place_address, user_name, text))
+    digest = hashlib.sha1(payload.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+class KeyIndex:
+    """Index en mémoire clé naturelle -> clé de substitution d'une dimension.
+
+    Chargé une fois depuis la base, puis complété avec les clés des nouvelles
+    lignes insérées : les avis sont rattachés à leurs dimensions sans jointure
+    sur des chaînes côté base.
+    """
+
+    def __init__(self, table, spec):
+        self.table = table
+        self.spec = spec
+        self.ids = None
+
+    def load(self, cursor):
+        cursor.execute(f"SELECT {self.spec['key']}, {self.spec['id']} FROM {self.table}")
+        self.ids = dict(cursor.fetchall())
+
+    def ensure(self, cursor, rows):
+        """Insère les lignes de dimension inconnues et enregistre leurs clés."""
+        if self.ids is None:
+            self.load(cursor)
+        key = self.spec["key"]
+        if self.table not in MUTABLE_DIMENSIONS:
+            rows = rows[~rows[key].isin(list(self.ids))]
+        if rows.empty:
+            return 0
+
+        columns = [key] + self.spec["attributes"]
+        # Staging sans la clé de substitution ni ses valeurs par défaut : pas de nextval() inutile
+        cursor.execute(
+            f"CREATE TEMP TABLE stg_{self.table} ON COMMIT DROP AS "
+            f"SELECT {', '.join(columns)} FROM {self.table} WITH NO DATA"
+        )
+        _copy_frame(cursor, f"stg_{self.table}", rows, columns)
+        staged = f"(SELECT DISTINCT ON ({key}) {', '.join(columns)} FROM stg_{self.table} ORDER BY {key}) s"
+
+        # Lignes existantes : mise à jour des attributs (un attribut inconnu, NULL, ne remplace pas
+        # la valeur déjà chargée)
+        updated = 0
+        if self.spec["attributes"]:
+            updates = ", ".join(f"{c} = COALESCE(s.{c}, t.{c})" for c in self.spec["attributes"])
+            cursor.execute(f"UPDATE {self.table} t SET {updates} FROM {staged} WHERE t.{key} = s.{key}")
+            updated = cursor.rowcount
 
-    # Convert to DataFrame if necessary
-    if isinstance(transformed_data, dict):
-        transformed_data = pd.DataFrame(transformed_data)
+        # Nouvelles lignes seulement : un INSERT ... ON CONFLICT sur une ligne existante
+        # consommerait quand même une valeur de la séquence
+        cursor.execute(
+            f"INSERT INTO {self.table} ({', '.join(columns)}) "
+            f"SELECT {', '.join('s.' + c for c in columns)} FROM {staged} "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {self.table} t WHERE t.{key} = s.{key}) "
+            f"ON CONFLICT ({key}) DO NOTHING"
+        )
+        inserted = cursor.rowcount
 
-    # Connect to the PostgreSQL database
-    engine = create_engine('postgresql://data_analyst:0@localhost:5432/bank_reviews_dw')
+        # Clés de toutes les lignes envoyées (y compris celles ajoutées par une autre exécution)
+        cursor.execute(
+            f"SELECT {key}, {self.spec['id']} FROM {self.table} "
+            f"WHERE {key} IN (SELECT {key} FROM stg_{self.table})"
+        )
+        self.ids.update(cursor.fetchall())
+        return inserted + updated
+
+    def lookup(self, keys):
+        """Clés de substitution (Int64, <NA> si inconnue) pour une série de clés naturelles."""
+        return keys.map(self.ids).astype("Int64")
+
+
+# Index des clés par base, conservés pendant l'exécution
+_key_indexes = {}
+
+
+def get_key_indexes(url=DW_URL):
+    if url not in _key_indexes:
+        _key_indexes[url] = {table: KeyIndex(table, spec) for table, spec in DIMENSIONS.items()}
+    return _key_indexes[url]
+
+
+def _parse_topics(value):
+    """Les topics arrivent en dict ou en JSON (fichier de résultats)."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return None
+    return value if isinstance(value, dict) else None
+
+
+def _to_dates(dates):
+    """Dates des avis ; une année seule (ancienne sortie du transform) devient le 1er janvier."""
+    if pd.api.types.is_numeric_dtype(dates):
+        return pd.to_datetime(dates.astype("Int64").astype("string"), format="%Y", errors="coerce")
+    return pd.to_datetime(dates, errors="coerce")
+
+
+def _review_topics(data, topic_words=None, topic_versions=None):
+    """Clé du topic de chaque avis et lignes de dim_topics (topic, words, label, model_version).
+
+    Le transform écrit l'id du topic ("topic_id") et la version du modèle qui
+    l'a assigné ("topic_version"), les mots de chaque version étant dans les
+    métadonnées du fichier (topic_versions) : "Sujet 3" de deux versions
+    différentes donne deux lignes de dim_topics. Les résultats sans version
+    utilisent topic_words ; les anciens résultats portent un dict {label: mots} par avis.
+    """
+    columns = ["topic", "words", "label", "model_version"]
+    if "topic_id" in data:
+        ids = data["topic_id"].astype("Int64")
+        labels = [None if pd.isna(i) else f"Sujet {i}" for i in ids]
+        if "topic_version" in data:
+            versions = [None if pd.isna(v) else v for v in data["topic_version"]]
+            topic_words = None
+        else:
+            versions = [None] * len(data)
+        review_topics = pd.Series(
+            [None if label is None else (label if version is None else f"{version}/{label}")
+             for label, version in zip(labels, versions)],
+            index=data.index, dtype=object
+        )
+
+        words = {(None, label): w for label, w in (topic_words or {}).items()}
+        for version, version_words in (topic_versions or {}).items():
+            words.update(((version, label), w) for label, w in version_words.items())
+        keys = set(zip(versions, labels)) | set(words)
+        rows = [
+            (label if version is None else f"{version}/{label}",
+             ", ".join(words[version, label]) if (version, label) in words else None, label, version)
+            for version, label in keys if label is not None
+        ]
+        return review_topics, pd.DataFrame(sorted(rows, key=lambda row: row[0]), columns=columns)
+
+    topics = data["topics"].map(_parse_topics)
+    review_topics = topics.map(lambda t: next(iter(t)) if t else None)
+    dim_topics = pd.DataFrame(
+        [(label, ", ".join(words), label, None) for t in topics.dropna() for label, words in t.items()],
+        columns=columns
+    ).drop_duplicates("topic")
+    return review_topics, dim_topics
+
+
+def build_tables(transformed_data, topic_words=None, topic_versions=None):
+    """Construit les dimensions et la table de faits (avec ses clés naturelles).
+
+    topic_words: mots de chaque topic ({"Sujet i": [...]}) quand les avis ne portent que topic_id ;
+    topic_versions: mots des topics de chaque version du modèle ({version: {"Sujet i": [...]}}).
+    """
+    data = transformed_data
+    score = data["sentiment_proba"] if "sentiment_proba" in data else data["score"]
+    user_names = data["user_name"] if "user_name" in data else pd.Series(None, index=data.index, dtype=object)
 
-    # Extract dimension tables
-    dim_topics = transformed_data[["topics"]]
-    
     # Make sure the date exists and extract day/month/year if needed
-    transformed_data["date"] = pd.to_datetime(transformed_data["date"], errors="coerce")
-    transformed_data["day"] = transformed_data["date"].dt.day
-    transformed_data["month"] = transformed_data["date"].dt.month
-    transformed_data["year"] = transformed_data["date"].dt.year
-    dim_date = transformed_data[["date", "day", "month", "year"]].drop_duplicates()
+    dates = _to_dates(data["date"])
+    review_dates = dates.dt.date
+    distinct_dates = dates.dropna().drop_duplicates()
+    dim_date = pd.DataFrame({
+        "date": distinct_dates.dt.date,
+        "day": distinct_dates.dt.day,
+        "month": distinct_dates.dt.month,
+        "year": distinct_dates.dt.year
+    })
+
+    review_topics, dim_topics = _review_topics(data, topic_words, topic_versions)
+
+    dim_agency = data[["place_address", "city"]].dropna(subset=["place_address"]).drop_duplicates("place_address")
+
+    facts = pd.DataFrame({
+        "review_id": [review_id(a, u, t) for a, u, t in zip(data["place_address"], user_names, data["text"])],
+        "place_address": data["place_address"].to_numpy(),
+        "date": review_dates.to_numpy(),
+        "topic": review_topics.to_numpy(),
+        "review": data["text"].to_numpy(),
+        "sentiment": data["sentiment"].to_numpy(),
+        "score": score.to_numpy()
+    })
+
+    return {"dim_agency": dim_agency, "dim_date": dim_date, "dim_topics": dim_topics}, facts
+
+
+def _parse_term_ids(value):
+    """Identifiants de termes d'un avis : tableau (Parquet), liste (NDJSON) ou JSON."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return []
+    if value is None or (np.ndim(value) == 0 and pd.isna(value)):
+        return []
+    return value
+
+
+def build_review_terms(transformed_data, review_ids, aspect_terms):
+    """Lignes de dim_terms et du pont avis <-> termes (review_id, term, mentions).
 
-    reviews = transformed_data[["place_address", "text", "sentiment", "score"]].rename(columns={"text": "review"})
-    dim_agency = transformed_data[["place_address", "city"]].drop_duplicates()
+    aspect_ids (identifiants propres au fichier de résultats) sont traduits en
+    termes avec aspect_terms, la table des termes du fichier (métadonnées).
 
-    # Save to PostgreSQL
-    reviews.to_sql('reviews', engine, if_exists="append", index=False)
-    dim_date.to_sql('dim_date', engine, if_exists="append", index=False)
-    dim_topics.to_sql('dim_topics', engine, if_exists="append", index=False)
-    dim_agency.to_sql('dim_agency', engine, if_exists="append", index=False)
+    Returns:
+        (pd.DataFrame, pd.DataFrame) ; (None, None) si les résultats n'ont pas d'aspects
+    """
+    if "aspect_ids" not in transformed_data or not aspect_terms:
+        return None, None
+    pairs = pd.DataFrame({
+        "review_id": np.asarray(review_ids),
+        "local_id": transformed_data["aspect_ids"].map(_parse_term_ids).to_numpy()
+    }).explode("local_id").dropna(subset=["local_id"])
+    pairs["term"] = np.asarray(aspect_terms, dtype=object)[pairs["local_id"].astype(int).to_numpy()]
+    review_terms = pairs.groupby(["review_id", "term"]).size().rename("mentions").reset_index()
+    dim_terms = pd.DataFrame({"term": review_terms["term"].unique()})
+    return dim_terms, review_terms
 
 
+def _copy_frame(cursor, table, df, columns):
+    """Envoie un DataFrame dans une table via COPY FROM STDIN (format CSV)."""
+    buffer = io.StringIO()
+    df[columns].to_csv(buffer, index=False, header=False, na_rep="\\N")
+    buffer.seek(0)
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    if hasattr(cursor, "copy_expert"):
+        cursor.copy_expert(sql, buffer)
+    else:
+        # psycopg 3
+        with cursor.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def create_schema(cursor):
+    """Crée les dimensions et la table de faits si besoin.
+
+    Les tables créées auparavant (clés texte, ou sans clé via DataFrame.to_sql)
+    ne sont pas migrées : elles doivent être recréées une fois.
+    """
+    for table, spec in DIMENSIONS.items():
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({spec['ddl']})")
+        for column in spec.get("added_columns", []):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column}")
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {FACT['table']} ({FACT['ddl']})")
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {REVIEW_TERMS['table']} ({REVIEW_TERMS['ddl']})")
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS {REVIEW_TERMS['table']}_term_id_idx ON {REVIEW_TERMS['table']} (term_id)"
+    )
+    for column in ("agency_id", "date_id", "topic_id"):
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {FACT['table']}_{column}_idx ON {FACT['table']} ({column})"
+        )
+    for table, spec in AGGREGATES.items():
+        cursor.execute("SELECT to_regclass(%s)", (table,))
+        created = cursor.fetchone()[0] is None
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({spec['ddl']})")
+        if created:
+            # Nouvel agrégat sur une table de faits déjà remplie : calcul complet une fois
+            _rebuild_aggregate(cursor, table, spec)
+
+
+def _aggregate_select(spec, source):
+    """SELECT qui agrège des avis signés (agency_id, date_id, topic_id, sentiment, score, sign)."""
+    groups = ", ".join(f"{expr} AS {column}" for column, expr in spec["groups"].items())
+    measures = ", ".join(f"COALESCE({expr}, 0) AS {column}" for column, expr in spec["measures"].items())
+    return (
+        f"SELECT {groups}, {measures} FROM {source} f "
+        f"JOIN dim_agency a ON a.agency_id = f.agency_id "
+        f"JOIN dim_date d ON d.date_id = f.date_id "
+        f"WHERE {spec['where']} "
+        f"GROUP BY {', '.join(str(i + 1) for i in range(len(spec['groups'])))}"
+    )
+
+
+def _all_facts():
+    return f"(SELECT {', '.join(AGGREGATED_COLUMNS)}, 1 AS sign FROM {FACT['table']})"
+
+
+def _rebuild_aggregate(cursor, table, spec):
+    columns = list(spec["groups"]) + list(spec["measures"])
+    cursor.execute(f"DELETE FROM {table}")
+    cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) {_aggregate_select(spec, _all_facts())}")
+
+
+def _stage_previous_facts(cursor):
+    """Copie, avant la fusion, l'état actuel des avis présents dans stg_reviews (ceux qui seront mis à jour)."""
+    table, key = FACT["table"], FACT["key"]
+    cursor.execute(
+        f"CREATE TEMP TABLE old_{table} ON COMMIT DROP AS "
+        f"SELECT {key}, {', '.join(AGGREGATED_COLUMNS)} FROM {table} "
+        f"WHERE {key} IN (SELECT {key} FROM stg_{table})"
+    )
+
+
+def _update_aggregates(cursor):
+    """Applique aux agrégats le delta de la fusion qui vient d'avoir lieu.
+
+    Un avis nouveau compte +1 ; un avis dont une colonne agrégée a changé
+    retire son ancienne version (-1) et ajoute la nouvelle (+1) ; un avis
+    rechargé à l'identique est ignoré.
+
+    Returns:
+        int: nombre d'avis du delta (nouveaux ou modifiés)
+    """
+    table, key = FACT["table"], FACT["key"]
+    changed = (
+        f"({', '.join('n.' + c for c in AGGREGATED_COLUMNS)}) IS DISTINCT FROM "
+        f"({', '.join('o.' + c for c in AGGREGATED_COLUMNS)})"
+    )
+    cursor.execute(
+        f"CREATE TEMP TABLE delta_{table} ON COMMIT DROP AS "
+        f"SELECT {', '.join('n.' + c for c in AGGREGATED_COLUMNS)}, 1 AS sign "
+        f"FROM {table} n LEFT JOIN old_{table} o ON o.{key} = n.{key} "
+        f"WHERE n.{key} IN (SELECT {key} FROM stg_{table}) AND (o.{key} IS NULL OR {changed}) "
+        f"UNION ALL "
+        f"SELECT {', '.join('o.' + c for c in AGGREGATED_COLUMNS)}, -1 AS sign "
+        f"FROM old_{table} o JOIN {table} n ON n.{key} = o.{key} WHERE {changed}"
+    )
+    cursor.execute(f"SELECT count(*) FILTER (WHERE sign = 1) FROM delta_{table}")
+    changed_reviews = cursor.fetchone()[0]
+    if changed_reviews:
+        for aggregate, spec in AGGREGATES.items():
+            columns = list(spec["groups"]) + list(spec["measures"])
+            updates = [f"{c} = {aggregate}.{c} + EXCLUDED.{c}" for c in spec["measures"]]
+            updates += [f"{c} = EXCLUDED.{c}" for c in spec["groups"] if c not in spec["key"]]
+            cursor.execute(
+                f"INSERT INTO {aggregate} ({', '.join(columns)}) "
+                f"{_aggregate_select(spec, f'delta_{table}')} "
+                f"ON CONFLICT ({', '.join(spec['key'])}) DO UPDATE SET {', '.join(updates)}"
+            )
+            cursor.execute(f"DELETE FROM {aggregate} WHERE reviews = 0")
+    cursor.execute(f"DROP TABLE old_{table}, delta_{table}")
+    return changed_reviews
+
+
+def _merge_facts(cursor, facts):
+    """Fusionne les avis dans la table de faits (INSERT ... ON CONFLICT)."""
+    table, key, columns = FACT["table"], FACT["key"], FACT["columns"]
+    cursor.execute(
+        f"CREATE TEMP TABLE stg_{table} ON COMMIT DROP AS SELECT {', '.join(columns)} FROM {table} WITH NO DATA"
+    )
+    _copy_frame(cursor, f"stg_{table}", facts, columns)
+    _stage_previous_facts(cursor)
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in columns if c != key)
+    cursor.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"SELECT DISTINCT ON ({key}) {', '.join(columns)} FROM stg_{table} ORDER BY {key} "
+        f"ON CONFLICT ({key}) DO UPDATE SET {updates}"
+    )
+    return cursor.rowcount
+
+
+def _merge_review_terms(cursor, review_terms):
+    """Remplace les termes des avis du lot (stg_reviews) par ceux de review_terms."""
+    table, columns = REVIEW_TERMS["table"], REVIEW_TERMS["columns"]
+    cursor.execute(f"DELETE FROM {table} WHERE review_id IN (SELECT review_id FROM stg_{FACT['table']})")
+    # Un même avis présent deux fois dans le lot : ses termes ne sont gardés qu'une fois
+    _copy_frame(cursor, table, review_terms.drop_duplicates(["review_id", "term_id"]), columns)
+    return len(review_terms)
+
+
+def load_frame(transformed_data, url=DW_URL, topic_words=None, aspect_terms=None, topic_versions=None):
+    """Charge les résultats du transform dans l'entrepôt en une seule transaction.
+
+    Les dimensions reçoivent des clés de substitution entières (index en
+    mémoire chargé une fois par exécution) ; la table de faits ne contient que
+    ces clés et l'identifiant stable de l'avis. Chaque table passe par COPY
+    dans une table de staging puis est fusionnée : un rechargement ne crée pas
+    de doublons. Les agrégats (AGGREGATES) reçoivent le delta de la fusion
+    dans la même transaction.
+
+    aspect_terms: table des termes du fichier de résultats, pour charger les
+    aspects des avis (dim_terms et review_terms).
+    """
+    metrics = get_run("load")
+    with metrics.stage("build_tables", items=len(transformed_data)):
+        dimensions, facts = build_tables(transformed_data, topic_words, topic_versions)
+        dim_terms, review_terms = build_review_terms(transformed_data, facts["review_id"], aspect_terms)
+        if dim_terms is not None:
+            dimensions["dim_terms"] = dim_terms
+    indexes = get_key_indexes(url)
+
+    connection = get_engine(url).raw_connection()
+    try:
+        cursor = connection.cursor()
+        create_schema(cursor)
+        with metrics.stage("load_dimensions") as stage:
+            for table, rows in dimensions.items():
+                inserted = indexes[table].ensure(cursor, rows)
+                stage.items += len(rows)
+                print(f"{table}: {inserted} lignes insérées / mises à jour")
+
+        with metrics.stage("load_facts", items=len(facts)):
+            facts["agency_id"] = indexes["dim_agency"].lookup(facts["place_address"])
+            facts["date_id"] = indexes["dim_date"].lookup(facts["date"])
+            facts["topic_id"] = indexes["dim_topics"].lookup(facts["topic"])
+            merged = _merge_facts(cursor, facts)
+            print(f"{FACT['table']}: {len(facts)} avis envoyés, {merged} insérés / mis à jour")
+        with metrics.stage("aggregates") as stage:
+            stage.items = _update_aggregates(cursor)
+            print(f"Agrégats: {stage.items} avis nouveaux ou modifiés")
+        if review_terms is not None:
+            with metrics.stage("load_terms", items=len(review_terms)):
+                review_terms["term_id"] = indexes["dim_terms"].lookup(review_terms["term"])
+                merged = _merge_review_terms(cursor, review_terms)
+                print(f"{REVIEW_TERMS['table']}: {merged} termes d'avis chargés")
+        with metrics.stage("commit"):
+            connection.commit()
+    except Exception:
+        connection.rollback()
+        # Les clés ajoutées pendant la transaction annulée ne sont plus valides
+        _key_indexes.pop(url, None)
+        raise
+    finally:
+        connection.close()
+
+
+def _fetch_frame(cursor, query):
+    cursor.execute(query)
+    return pd.DataFrame(cursor.fetchall(), columns=[c[0] for c in cursor.description])
+
+
+def reconcile_aggregates(url=DW_URL, repair=False, tolerance=AGGREGATE_TOLERANCE):
+    """Compare les agrégats tenus à jour à un calcul complet depuis la table de faits.
+
+    Args:
+        repair (bool): recalcule entièrement les agrégats qui divergent
+        tolerance (float): écart relatif toléré sur les sommes de scores
+
+    Returns:
+        dict: {agrégat: DataFrame des groupes qui diffèrent (valeurs _expected / _actual)}
+    """
+    connection = get_engine(url).raw_connection()
+    try:
+        cursor = connection.cursor()
+        create_schema(cursor)
+        mismatches = {}
+        for table, spec in AGGREGATES.items():
+            columns = list(spec["groups"]) + list(spec["measures"])
+            expected = _fetch_frame(cursor, _aggregate_select(spec, _all_facts()))
+            actual = _fetch_frame(cursor, f"SELECT {', '.join(columns)} FROM {table}")
+            merged = expected.merge(
+                actual, on=spec["key"], how="outer", suffixes=("_expected", "_actual"), indicator=True
+            )
+            differs = merged["_merge"] != "both"
+            for measure in spec["measures"]:
+                exp = merged[f"{measure}_expected"].astype(float)
+                act = merged[f"{measure}_actual"].astype(float)
+                differs |= (exp - act).abs() > tolerance * act.abs().clip(lower=1)
+            mismatches[table] = merged[differs].drop(columns="_merge").reset_index(drop=True)
+            print(f"{table}: {len(actual)} groupes, {differs.sum()} écarts avec le calcul complet")
+
+            if repair and differs.any():
+                _rebuild_aggregate(cursor, table, spec)
+                print(f"{table}: recalculé depuis {FACT['table']}")
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return mismatches
+
+
+def artifact_rows(path):
+    """Nombre d'avis d'un fichier de résultats, sans le lire : métadonnées Parquet ou fichier .meta.json."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).metadata.num_rows
+    with open(path + ".meta.json", encoding="utf-8") as f:
+        return json.load(f).get("rows")
+
+
+def iter_artifact(path, batch_rows=LOAD_BATCH_ROWS):
+    """Lit un fichier de résultats du transform par lots, sans le charger en entier.
+
+    Parquet : fichier projeté en mémoire, un lot par groupe de lignes lu ;
+    NDJSON : lecture en flux, types repris du fichier .meta.json.
+    """
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=batch_rows):
+            yield batch.to_pandas()
+        return
+
+    with open(path + ".meta.json", encoding="utf-8") as f:
+        schema = json.load(f).get("schema") or {}
+    # Les dates sont relues par _to_dates
+    schema = {c: t for c, t in schema.items() if not t.startswith("datetime")}
+    with pd.read_json(path, orient="records", lines=True, dtype=schema, chunksize=batch_rows) as reader:
+        yield from reader
+
+
+def load_artifact(reference, url=DW_URL, batch_rows=LOAD_BATCH_ROWS):
+    """Charge un fichier de résultats référencé par le transform ({path, format, rows, sha256}).
+
+    L'empreinte et le nombre d'avis sont vérifiés avant le chargement. Chaque lot est chargé dans sa
+    propre transaction ; les fusions sont idempotentes (review_id), un
+    rechargement après échec ne crée pas de doublons.
+
+    Returns:
+        int: nombre d'avis chargés
+    """
+    path = os.path.expanduser(reference["path"])
+    if reference.get("sha256") and file_sha256(path) != reference["sha256"]:
+        raise ValueError(f"Empreinte SHA-256 différente pour {path} : fichier modifié depuis le transform")
+    # Vérifié avant le premier lot : un fichier incomplet n'est pas chargé en partie
+    expected_rows = artifact_rows(path)
+    if reference.get("rows") is not None and expected_rows != reference["rows"]:
+        raise ValueError(f"{expected_rows} avis dans {path}, {reference['rows']} attendus")
+
+    with open(path + ".meta.json", encoding="utf-8") as f:
+        metadata = json.load(f)
+    topic_words, aspect_terms = metadata.get("topic_words"), metadata.get("aspect_terms")
+    topic_versions = metadata.get("topic_versions")
+
+    rows = 0
+    for batch in iter_artifact(path, batch_rows):
+        load_frame(batch, url, topic_words, aspect_terms, topic_versions)
+        rows += len(batch)
+    return rows
+
+
+def load_tosql(**kwargs):
+    # Le transform ne passe par XCom que la référence du fichier de résultats
+    reference = kwargs['ti'].xcom_pull(task_ids='transform_task')
+    if reference is None:
+        print("Aucun résultat à charger")
+        return
+
+    start = time.perf_counter()
+    if isinstance(reference, dict) and "path" in reference:
+        rows = load_artifact(reference)
+    else:
+        # Ancien format : données complètes dans XCom
+        transformed_data = pd.DataFrame(reference) if isinstance(reference, dict) else reference
+        load_frame(transformed_data)
+        rows = len(transformed_data)
+    get_run("load").get_stage("load").observe(time.perf_counter() - start, rows, peak_rss=peak_rss_bytes())
+    finish_run("load")
@@ -0,0 +1,141 @@
+"""Chargement dans une base PostgreSQL locale (jetable : les tables du projet sont recréées).
+
+Usage: CIH_DW_URL=postgresql://user@localhost/cih_test python -m pytest tests/test_load.py
+"""
+import os
+import sys
+
+import pytest
+
+DW_URL = os.environ.get("CIH_DW_URL")
+if not DW_URL:
+    pytest.skip("CIH_DW_URL non défini (base PostgreSQL de test)", allow_module_level=True)
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, "transform"))
+sys.path.insert(0, os.path.join(HERE, os.pardir, "load"))
+
+CITIES = ["Casablanca", "Rabat", "Marrakech"]
+TERMS = ["service", "attente", "accueil", "conseiller"]
+TOPIC_VERSIONS = {"v1": {f"Sujet {i}": [f"mot{i}", f"terme{i}"] for i in range(1, 4)}}
+
+
+def transformed_frame(n_reviews=60):
+    """Résultats du transform : une agence par ville, dates sur trois mois."""
+    rng = np.random.default_rng(0)
+    agency = rng.integers(0, len(CITIES), n_reviews)
+    return pd.DataFrame({
+        "place_address": [f"{10 + a} Bd Mohammed V, {CITIES[a]}" for a in agency],
+        "city": [CITIES[a] for a in agency],
+        "user_name": [f"Client {k}" for k in range(n_reviews)],
+        "text": [f"avis {k}" for k in range(n_reviews)],
+        "date": pd.Timestamp("2026-01-15") + pd.to_timedelta(rng.integers(0, 90, n_reviews), unit="D"),
+        "sentiment": rng.choice(["NEGATIVE", "NEUTRAL", "POSITIVE"], n_reviews),
+        "sentiment_proba": rng.random(n_reviews).astype("float32"),
+        "topic_id": pd.array(rng.integers(1, 4, n_reviews), dtype="Int16"),
+        "topic_version": pd.array(["v1"] * n_reviews, dtype="string"),
+        "aspect_ids": [rng.integers(0, len(TERMS), 2).astype(np.int32) for _ in range(n_reviews)],
+    })
+
+
+def write_artifact(folder, fmt, frame):
+    from result_writer import open_result_writer
+
+    writer = open_result_writer(os.path.join(folder, "results"), fmt, metadata={
+        "topic_versions": TOPIC_VERSIONS, "aspect_terms": TERMS
+    })
+    with writer:
+        writer.write(frame.iloc[:len(frame) // 2])
+        writer.write(frame.iloc[len(frame) // 2:])
+    return writer.reference()
+
+
+def fetch(query):
+    import load
+
+    connection = load.get_engine(DW_URL).raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(query)
+        return cursor.fetchall()
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def warehouse():
+    """Base vide : tables du projet supprimées, index des clés oubliés."""
+    import load
+
+    tables = ["review_terms", *load.AGGREGATES, load.FACT["table"], *load.DIMENSIONS]
+    connection = load.get_engine(DW_URL).raw_connection()
+    try:
+        connection.cursor().execute(f"DROP TABLE IF EXISTS {', '.join(tables)} CASCADE")
+        connection.commit()
+    finally:
+        connection.close()
+    load._key_indexes.clear()
+    yield load
+    load._key_indexes.clear()
+
+
+def table_state():
+    return {
+        "reviews": fetch("SELECT count(*), max(agency_id), max(topic_id) FROM reviews")[0],
+        "agencies": fetch("SELECT count(*) FROM dim_agency")[0][0],
+        "agg_sentiment": fetch(
+            "SELECT agency_id, month, sentiment, reviews, scored, round(score_sum::numeric, 6) "
+            "FROM agg_sentiment_monthly ORDER BY 1, 2, 3"
+        ),
+        "agg_topics": fetch("SELECT * FROM agg_topic_monthly ORDER BY 1, 2, 3, 4"),
+        "review_terms": fetch("SELECT count(*), sum(mentions) FROM review_terms")[0],
+    }
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "ndjson"])
+def test_load_artifact(warehouse, tmp_path, fmt):
+    frame = transformed_frame()
+    reference = write_artifact(str(tmp_path), fmt, frame)
+
+    assert warehouse.load_artifact(reference, DW_URL, batch_rows=25) == len(frame)
+
+    state = table_state()
+    assert state["reviews"][0] == len(frame)
+    assert state["agencies"] == frame["place_address"].nunique()
+    assert sum(row[3] for row in state["agg_sentiment"]) == len(frame)
+    assert state["review_terms"][1] == sum(len(ids) for ids in frame["aspect_ids"])
+    topics = fetch("SELECT topic, label, model_version, words FROM dim_topics ORDER BY topic")
+    assert topics[0] == ("v1/Sujet 1", "Sujet 1", "v1", "mot1, terme1")
+
+
+def test_reload_is_idempotent(warehouse, tmp_path):
+    reference = write_artifact(str(tmp_path), "parquet", transformed_frame())
+    warehouse.load_artifact(reference, DW_URL)
+    before = table_state()
+
+    # Nouvelle exécution : index des clés rechargé depuis la base
+    warehouse._key_indexes.clear()
+    warehouse.load_artifact(reference, DW_URL)
+
+    assert table_state() == before
+    # Aucune valeur de séquence consommée par le rechargement
+    assert before["reviews"][1] == before["agencies"]
+    assert fetch("SELECT max(topic_id) FROM dim_topics")[0][0] == len(TOPIC_VERSIONS["v1"])
+
+
+def test_reconcile_aggregates_after_update(warehouse, tmp_path):
+    frame = transformed_frame()
+    warehouse.load_artifact(write_artifact(str(tmp_path / "first"), "parquet", frame), DW_URL)
+
+    # Deuxième chargement : sentiments modifiés et nouveaux avis
+    changed = pd.concat([frame.iloc[:20], transformed_frame(80).iloc[60:]], ignore_index=True)
+    changed.loc[:19, "sentiment"] = "POSITIVE"
+    changed.loc[:19, "sentiment_proba"] = np.float32(0.5)
+    warehouse.load_artifact(write_artifact(str(tmp_path / "second"), "ndjson", changed), DW_URL)
+
+    mismatches = warehouse.reconcile_aggregates(DW_URL)
+    assert all(len(rows) == 0 for rows in mismatches.values())
+    assert sum(row[3] for row in table_state()["agg_sentiment"]) == 80
@@ -0,0 +1,63 @@
+"""Scraper piloté sur le serveur local de pages factices (benchmarks/fixture_server.py).
+
+Nécessite Chrome et chromedriver (CHROMEDRIVER_PATH ou dans le PATH) ; sinon ignoré.
+
+Usage: python -m pytest tests/test_scraper.py
+"""
+import os
+import sys
+import shutil
+
+import pytest
+
+pytest.importorskip("selenium")
+pytest.importorskip("webdriver_manager")
+if not (os.environ.get("CHROMEDRIVER_PATH") or shutil.which("chromedriver")):
+    pytest.skip("chromedriver introuvable (CHROMEDRIVER_PATH)", allow_module_level=True)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, "extract"))
+sys.path.insert(0, os.path.join(HERE, os.pardir, "benchmarks"))
+
+from google_maps_scraper import GoogleMapsScraper, Pacer  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+N_AGENCIES = 2
+REVIEWS_PER_AGENCY = 25
+
+
+@pytest.fixture(scope="module")
+def server():
+    with FixtureServer(n_agencies=N_AGENCIES, reviews_per_agency=REVIEWS_PER_AGENCY,
+                       page_size=10, delay_ms=50) as server:
+        yield server
+
+
+@pytest.fixture(scope="module")
+def scraper(server):
+    scraper = GoogleMapsScraper(implicit_wait=0, explicit_wait=10, maps_url=server.maps_url,
+                                pacer=Pacer(0, 0), metrics_run="test_scraper")
+    yield scraper
+    scraper.close()
+
+
+def expected_reviews(server, index):
+    return sorted((r["user"], float(r["stars"]), r["text"]) for r in server.places[index]["reviews"])
+
+
+def test_agency_links(server, scraper):
+    scraper.search_places("cih banque maroc")
+    links = scraper.extract_agency_links(N_AGENCIES)
+
+    assert sorted(links) == [server.place_url(i) for i in range(N_AGENCIES)]
+
+
+@pytest.mark.parametrize("in_page", [True, False], ids=["in-page", "python"])
+def test_scrape_agency(server, scraper, in_page):
+    result = scraper.scrape_agency(server.place_url(1), target_reviews=100, in_page=in_page)
+
+    place = server.places[1]
+    assert result["place_details"]["name"] == place["name"]
+    assert len(result["reviews"]) == REVIEWS_PER_AGENCY
+    # Textes complets : les avis longs ont été dépliés (bouton "More")
+    assert sorted((r["user_name"], r["rating"], r["text"]) for r in result["reviews"]) == expected_reviews(server, 1)
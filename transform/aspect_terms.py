@@ -0,0 +1,106 @@
+import os
+import json
+import numpy as np
+
+# Composants spaCy inutiles à l'extraction des groupes nominaux lemmatisés
+UNUSED_PIPES = ["ner", "textcat", "textcat_multilabel", "entity_linker", "entity_ruler", "spancat"]
+
+
+class TermVocabulary:
+    """Table des termes d'aspect : chaque terme distinct reçoit un identifiant entier stable.
+
+    Les avis ne portent que des identifiants (tableaux int32) ; la table est
+    sauvegardée entre deux exécutions pour que les identifiants ne changent pas.
+    """
+
+    def __init__(self, terms=None):
+        self.terms = list(terms or [])
+        self.ids = {term: i for i, term in enumerate(self.terms)}
+
+    def __len__(self):
+        return len(self.terms)
+
+    def intern(self, term):
+        term_id = self.ids.get(term)
+        if term_id is None:
+            term_id = len(self.terms)
+            self.ids[term] = term_id
+            self.terms.append(term)
+        return term_id
+
+    def encode(self, terms):
+        return np.array([self.intern(t) for t in terms], dtype=np.int32)
+
+    def decode(self, term_ids):
+        return [self.terms[i] for i in term_ids]
+
+    def save(self, path):
+        path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.terms, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Charge une table sauvegardée, ou une table vide si elle n'existe pas encore."""
+        path = os.path.expanduser(path)
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+
+def doc_aspects(doc):
+    """Groupes nominaux lemmatisés d'un document, sans mots vides ni ponctuation.
+
+    Sans analyseur syntaxique (pas de noun_chunks), on garde les noms lemmatisés.
+    """
+    try:
+        spans = list(doc.noun_chunks)
+    except ValueError:
+        spans = [doc[i:i + 1] for i, token in enumerate(doc) if token.pos_ in ("NOUN", "PROPN")]
+
+    aspects = []
+    for span in spans:
+        words = [t.lemma_.lower() for t in span if t.is_alpha and not t.is_stop]
+        if words:
+            aspects.append(" ".join(words))
+    return aspects
+
+
+def extract_aspects(nlp, texts, batch_size=256, n_process=1):
+    """Termes d'aspect de chaque texte, en un seul passage nlp.pipe par lots.
+
+    Args:
+        nlp: modèle spaCy (model_registry.get_nlp())
+        texts (list): textes des avis
+        batch_size (int): textes par lot envoyé à spaCy
+        n_process (int): processus spaCy
+
+    Returns:
+        list: une liste de termes par texte
+    """
+    disable = [name for name in UNUSED_PIPES if name in nlp.pipe_names]
+    docs = nlp.pipe(
+        [t if isinstance(t, str) else "" for t in texts],
+        batch_size=batch_size, n_process=n_process, disable=disable
+    )
+    return [doc_aspects(doc) for doc in docs]
+
+
+def term_counts(term_id_arrays):
+    """Nombre de mentions de chaque identifiant présent dans les avis ({identifiant: mentions})."""
+    arrays = [np.asarray(a, dtype=np.int32) for a in term_id_arrays if a is not None and len(a)]
+    if not arrays:
+        return {}
+    ids, counts = np.unique(np.concatenate(arrays), return_counts=True)
+    return dict(zip(ids.tolist(), counts.tolist()))
+
+
+def top_terms(term_id_arrays, vocab, n=20):
+    """Termes les plus fréquents d'un ensemble d'avis (nuage de mots), par comptage des identifiants."""
+    counts = term_counts(term_id_arrays)
+    top = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+    return [(vocab.terms[i], count) for i, count in top]
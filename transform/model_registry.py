@@ -0,0 +1,222 @@
+import os
+import threading
+
+# Configuration des modèles, surchargeable par variables d'environnement ou configure()
+CONFIG = {
+    "sentiment_model": os.environ.get("CIH_SENTIMENT_MODEL", "nlptown/bert-base-multilingual-uncased-sentiment"),
+    "sentiment_revision": os.environ.get("CIH_SENTIMENT_REVISION", "main"),
+    "sentiment_backend": os.environ.get("CIH_SENTIMENT_BACKEND", "torch"),  # voir SENTIMENT_BACKENDS
+    "onnx_dir": os.environ.get("CIH_ONNX_DIR", "~/airflow/reviews_DB_source/onnx"),
+    # Avis surtout en français (darija en alphabet latin) : modèle français par défaut
+    "spacy_model": os.environ.get("CIH_SPACY_MODEL", "fr_core_news_sm"),
+    "device": os.environ.get("CIH_MODEL_DEVICE", "auto"),          # "auto", "cpu", "cuda", "cuda:1" ou un index
+    "torch_threads": int(os.environ.get("CIH_TORCH_THREADS", "0")),  # 0 = valeur par défaut de torch
+}
+
+# Moteurs d'inférence du modèle de sentiment :
+# "torch" (fp32, CPU ou GPU), "int8" (quantification dynamique torch, CPU),
+# "onnx" (graphe exporté, exécuté par ONNX Runtime, CPU)
+SENTIMENT_BACKENDS = ("torch", "int8", "onnx")
+
+# Registre des modèles chargés, partagé par tout le processus
+_models = {}
+_lock = threading.Lock()
+
+# Révision configurée (branche, tag ou commit) -> hash du commit du Hub
+_resolved_revisions = {}
+
+
+def configure(**overrides):
+    """Modifie la configuration avant le premier chargement des modèles."""
+    unknown = set(overrides) - set(CONFIG)
+    if unknown:
+        raise KeyError(f"Paramètres inconnus: {sorted(unknown)}")
+    if _models:
+        print(f"Modèles déjà chargés ({sorted(_models)}), la nouvelle configuration s'applique après clear()")
+    CONFIG.update(overrides)
+
+
+def get_model(name, loader):
+    """Retourne le modèle `name`, chargé une seule fois par processus avec loader()."""
+    model = _models.get(name)
+    if model is None:
+        with _lock:
+            model = _models.get(name)
+            if model is None:
+                model = loader()
+                _models[name] = model
+    return model
+
+
+def clear():
+    """Oublie les modèles chargés (ils seront rechargés au prochain appel)."""
+    with _lock:
+        _models.clear()
+
+
+def resolved_sentiment_revision():
+    """Hash du commit du modèle de sentiment désigné par la révision configurée.
+
+    Le cache des scores et l'export ONNX sont indexés par le commit, et non
+    par le nom de branche ("main"), pour être invalidés quand le modèle change.
+    Une branche est résolue une fois par processus, d'abord depuis le cache
+    local de huggingface_hub (le snapshot qui sera chargé, sans réseau), puis
+    par le Hub si le modèle n'a jamais été téléchargé ; à défaut, la révision
+    configurée est gardée. Les processus d'inférence reçoivent le commit
+    résolu (configure(sentiment_revision=...)) et ne le résolvent pas à nouveau.
+    """
+    name, revision = CONFIG["sentiment_model"], CONFIG["sentiment_revision"]
+    key = (name, revision)
+    if key in _resolved_revisions:
+        return _resolved_revisions[key]
+    if len(revision) == 40 and all(c in "0123456789abcdef" for c in revision):
+        commit = revision
+    else:
+        commit = _cached_commit(name, revision) or _hub_commit(name, revision)
+        if commit is None:
+            print(f"Commit de {name}@{revision} introuvable, la révision '{revision}' sert de version")
+            commit = revision
+    _resolved_revisions[key] = commit
+    return commit
+
+
+def _hub_commit(name, revision):
+    try:
+        from huggingface_hub import model_info
+        from huggingface_hub.utils import HfHubHTTPError
+    except ImportError:
+        return None
+    try:
+        return model_info(name, revision=revision).sha
+    except (HfHubHTTPError, OSError) as e:
+        # Hors ligne (HF_HUB_OFFLINE), Hub indisponible, modèle ou révision inconnus
+        print(f"Hub indisponible pour {name}@{revision}: {e}")
+        return None
+
+
+def _cached_commit(name, revision):
+    try:
+        from huggingface_hub.constants import HF_HUB_CACHE
+    except ImportError:
+        return None
+    ref_path = os.path.join(HF_HUB_CACHE, f"models--{name.replace('/', '--')}", "refs", revision)
+    if not os.path.exists(ref_path):
+        return None
+    with open(ref_path, encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+def resolve_device(device=None):
+    """Traduit la configuration en index de device pour transformers (-1 = CPU).
+
+    Bascule automatiquement sur le CPU si aucun GPU n'est disponible.
+    """
+    import torch
+
+    device = str(CONFIG["device"] if device is None else device).lower()
+    if device in ("cpu", "-1"):
+        return -1
+    if not torch.cuda.is_available():
+        if device != "auto":
+            print(f"Device '{device}' demandé mais aucun GPU disponible, utilisation du CPU")
+        return -1
+    if device in ("auto", "cuda", "gpu"):
+        return 0
+    return int(device.split(":")[-1])
+
+
+def _set_torch_threads():
+    import torch
+
+    if CONFIG["torch_threads"] > 0:
+        torch.set_num_threads(CONFIG["torch_threads"])
+
+
+def _load_sentiment_pipeline():
+    from transformers import pipeline
+
+    _set_torch_threads()
+    backend = CONFIG["sentiment_backend"]
+    if backend not in SENTIMENT_BACKENDS:
+        raise ValueError(f"Moteur de sentiment inconnu: {backend} (attendu: {', '.join(SENTIMENT_BACKENDS)})")
+    if backend == "int8":
+        return _load_int8_pipeline()
+    if backend == "onnx":
+        return _load_onnx_pipeline()
+
+    device = resolve_device()
+    kwargs = dict(
+        task="sentiment-analysis",
+        model=CONFIG["sentiment_model"],
+        revision=resolved_sentiment_revision()
+    )
+    try:
+        return pipeline(device=device, **kwargs)
+    except RuntimeError as e:
+        if device == -1:
+            raise
+        print(f"Chargement sur GPU impossible ({e}), utilisation du CPU")
+        return pipeline(device=-1, **kwargs)
+
+
+def _load_int8_pipeline():
+    """Même modèle, couches linéaires quantifiées en int8 à la volée (CPU uniquement)."""
+    import torch
+    from transformers import pipeline, AutoModelForSequenceClassification, AutoTokenizer
+
+    name, revision = CONFIG["sentiment_model"], resolved_sentiment_revision()
+    model = AutoModelForSequenceClassification.from_pretrained(name, revision=revision)
+    model = torch.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+    tokenizer = AutoTokenizer.from_pretrained(name, revision=revision)
+    return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer, device=-1)
+
+
+def onnx_export_dir():
+    """Dossier du graphe ONNX exporté pour le modèle et le commit de la révision configurée."""
+    name = f"{CONFIG['sentiment_model']}@{resolved_sentiment_revision()}".replace("/", "--")
+    return os.path.join(os.path.expanduser(CONFIG["onnx_dir"]), name)
+
+
+def _load_onnx_pipeline():
+    """Graphe ONNX du modèle, exporté au premier usage puis relu depuis onnx_export_dir()."""
+    try:
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+    except ImportError as e:
+        raise ImportError("Le moteur 'onnx' nécessite optimum[onnxruntime]") from e
+    from transformers import pipeline, AutoTokenizer
+
+    options = onnxruntime.SessionOptions()
+    if CONFIG["torch_threads"] > 0:
+        options.intra_op_num_threads = CONFIG["torch_threads"]
+
+    export_dir = onnx_export_dir()
+    if os.path.exists(os.path.join(export_dir, "model.onnx")):
+        model = ORTModelForSequenceClassification.from_pretrained(export_dir, session_options=options)
+        tokenizer = AutoTokenizer.from_pretrained(export_dir)
+    else:
+        name, revision = CONFIG["sentiment_model"], resolved_sentiment_revision()
+        print(f"Export ONNX de {name} vers {export_dir}")
+        model = ORTModelForSequenceClassification.from_pretrained(
+            name, revision=revision, export=True, session_options=options
+        )
+        tokenizer = AutoTokenizer.from_pretrained(name, revision=revision)
+        model.save_pretrained(export_dir)
+        tokenizer.save_pretrained(export_dir)
+    return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+
+
+def _load_spacy():
+    import spacy
+
+    return spacy.load(CONFIG["spacy_model"])
+
+
+def get_sentiment_pipeline():
+    """Pipeline Hugging Face de classification de sentiment (chargée au premier appel)."""
+    return get_model("sentiment", _load_sentiment_pipeline)
+
+
+def get_nlp():
+    """Modèle spaCy (chargé au premier appel)."""
+    return get_model("spacy", _load_spacy)
@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+
+
+class ResultCache:
+    """Cache disque (SQLite) des résultats NLP, adressé par le contenu des avis.
+
+    La clé est un hash du texte normalisé (sortie de preprocess_text), du nom
+    et de la version du modèle. Quand la version d'un modèle change, ses
+    anciennes entrées sont supprimées. La taille est bornée : au-delà de
+    max_entries, les entrées les moins récemment utilisées sont évincées.
+    """
+
+    # Nombre maximal de paramètres par requête SQLite
+    _CHUNK = 500
+
+    def __init__(self, path, max_entries=500000):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, model TEXT NOT NULL, value TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results(last_used)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS models (model TEXT PRIMARY KEY, version TEXT NOT NULL)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(text, model_name, model_version):
+        """Hash du texte normalisé, du modèle et de sa version."""
+        payload = "\0".join([model_name, model_version, text])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def check_model(self, model_name, model_version):
+        """Invalide les entrées d'un modèle si sa version a changé."""
+        row = self.conn.execute("SELECT version FROM models WHERE model = ?", (model_name,)).fetchone()
+        if row is not None and row[0] == model_version:
+            return
+        with self.conn:
+            if row is not None:
+                self.conn.execute("DELETE FROM results WHERE model = ?", (model_name,))
+                print(f"Cache invalidé pour {model_name}: {row[0]} -> {model_version}")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO models (model, version) VALUES (?, ?)",
+                (model_name, model_version)
+            )
+
+    def get_many(self, keys):
+        """Retourne un dict clé -> valeur pour les clés présentes dans le cache."""
+        keys = list(keys)
+        found = {}
+        for i in range(0, len(keys), self._CHUNK):
+            chunk = keys[i:i + self._CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT key, value FROM results WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            found.update((key, json.loads(value)) for key, value in rows)
+
+        # Rafraîchir la date d'utilisation des entrées trouvées (éviction LRU)
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE results SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+            )
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, model_name, items):
+        """Ajoute des résultats (dict clé -> valeur JSON-sérialisable) puis applique l'éviction."""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO results (key, model, value, last_used) VALUES (?, ?, ?, ?)",
+                [(key, model_name, json.dumps(value, ensure_ascii=False, default=_to_native), now)
+                 for key, value in items.items()]
+            )
+        self._evict()
+
+    def _evict(self):
+        """Supprime les entrées les moins récemment utilisées au-delà de max_entries."""
+        size = len(self)
+        if size <= self.max_entries:
+            return
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)",
+                (size - self.max_entries,)
+            )
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def stats(self):
+        """Compteurs de hits / misses depuis l'ouverture du cache."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self)
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+def _to_native(value):
+    """Convertit les scalaires numpy en types Python pour json.dumps."""
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Type non sérialisable: {type(value)}")
@@ -0,0 +1,201 @@
+import os
+import sys
+import glob
+import json
+import datetime
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+from file_digest import file_sha256
+
+
+class _ResultWriter:
+    """Écriture des résultats en un seul passage, bloc par bloc.
+
+    Les données sont écrites dans un fichier temporaire renommé de façon
+    atomique à la fermeture : un lecteur ne voit jamais un fichier partiel.
+    Le schéma et les métadonnées de l'exécution sont écrits dans un fichier
+    compagnon `<fichier>.meta.json`.
+    """
+
+    extension = ""
+    format = ""
+
+    def __init__(self, base_path, metadata=None):
+        self.path = os.path.expanduser(base_path) + self.extension
+        self.tmp_path = self.path + ".tmp"
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.metadata = dict(metadata or {})
+        self.metadata.setdefault("created_at", datetime.datetime.now().isoformat(timespec="seconds"))
+        self.metadata["format"] = self.format
+        self.rows = 0
+        self.schema = None
+
+    def write(self, df):
+        df = _prepare(df)
+        if self.schema is None:
+            self.schema = {column: str(dtype) for column, dtype in df.dtypes.items()}
+        self._write(df)
+        self.rows += len(df)
+
+    def close(self):
+        """Finalise le fichier et le rend visible sous son nom définitif."""
+        self._close()
+        if self.rows == 0 and not os.path.exists(self.tmp_path):
+            return None
+        os.replace(self.tmp_path, self.path)
+        self.metadata.update(rows=self.rows, schema=self.schema, sha256=file_sha256(self.path))
+        _atomic_write_json(self.path + ".meta.json", self.metadata)
+        return self.path
+
+    def reference(self):
+        """Référence légère du fichier écrit (à passer par XCom à la place des données)."""
+        return {
+            "path": self.path,
+            "format": self.format,
+            "rows": self.rows,
+            "sha256": self.metadata.get("sha256")
+        }
+
+    def abort(self):
+        """Abandonne l'écriture : le fichier précédent reste intact."""
+        try:
+            self._close()
+        finally:
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _write(self, df):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+
+class ParquetResultWriter(_ResultWriter):
+    """Écrit les résultats en Parquet (colonnes typées), un row group par bloc."""
+
+    extension = ".parquet"
+    format = "parquet"
+
+    def __init__(self, base_path, metadata=None):
+        super().__init__(base_path, metadata)
+        self._writer = None
+
+    def _write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            # Colonnes entièrement vides dans le premier bloc : typées en texte.
+            # Catégories : index int32, les blocs suivants peuvent avoir plus de valeurs
+            schema = table.schema
+            for i, field in enumerate(schema):
+                if pa.types.is_null(field.type):
+                    schema = schema.set(i, field.with_type(pa.string()))
+                elif pa.types.is_dictionary(field.type):
+                    schema = schema.set(i, field.with_type(pa.dictionary(pa.int32(), field.type.value_type)))
+            # Métadonnées de l'exécution : uniquement dans le fichier .meta.json, complet à la fermeture
+            table = table.cast(schema)
+            self._writer = pq.ParquetWriter(self.tmp_path, schema)
+        else:
+            table = pa.Table.from_pandas(df, schema=self._writer.schema, preserve_index=False)
+        self._writer.write_table(table)
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class NdjsonResultWriter(_ResultWriter):
+    """Écrit les résultats en NDJSON (un avis par ligne), sérialisation vectorisée."""
+
+    extension = ".ndjson"
+    format = "ndjson"
+
+    def __init__(self, base_path, metadata=None):
+        super().__init__(base_path, metadata)
+        self._file = None
+
+    def _write(self, df):
+        if self._file is None:
+            self._file = open(self.tmp_path, "w", encoding="utf-8")
+        if len(df):
+            lines = df.to_json(orient="records", lines=True, force_ascii=False, date_format="iso")
+            self._file.write(lines if lines.endswith("\n") else lines + "\n")
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def open_result_writer(base_path, fmt="auto", metadata=None):
+    """Choisit le format de sortie : Parquet si pyarrow est installé, sinon NDJSON."""
+    if fmt == "auto":
+        try:
+            import pyarrow.parquet  # noqa: F401
+            fmt = "parquet"
+        except ImportError:
+            fmt = "ndjson"
+    writers = {"parquet": ParquetResultWriter, "ndjson": NdjsonResultWriter}
+    if fmt not in writers:
+        raise ValueError(f"Format de sortie inconnu: {fmt}")
+    return writers[fmt](base_path, metadata)
+
+
+def read_results(path):
+    """Relit un fichier de résultats avec ses types de colonnes."""
+    path = os.path.expanduser(path)
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    with open(path + ".meta.json", encoding="utf-8") as f:
+        schema = json.load(f).get("schema") or {}
+    return pd.read_json(path, orient="records", lines=True, dtype=schema)
+
+
+def prune_results(base_path, keep):
+    """Supprime les fichiers de résultats versionnés `<base_path>_*` au-delà des `keep` plus récents."""
+    base_path = os.path.expanduser(base_path)
+    paths = sorted(
+        (p for p in glob.glob(base_path + "_*") if not p.endswith((".meta.json", ".tmp"))),
+        key=os.path.getmtime, reverse=True
+    )
+    for path in paths[keep:]:
+        for old in (path, path + ".meta.json"):
+            if os.path.exists(old):
+                os.remove(old)
+
+
+def _prepare(df):
+    """Sérialise en JSON les colonnes contenant des dict / listes (ex: topics)."""
+    nested = [
+        column for column in df.columns
+        if df[column].dtype == object and df[column].map(lambda v: isinstance(v, (dict, list))).any()
+    ]
+    if not nested:
+        return df
+    df = df.copy(deep=False)
+    for column in nested:
+        df[column] = df[column].map(
+            lambda v: json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v
+        )
+    return df
+
+
+def _atomic_write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4, default=str)
+    os.replace(tmp_path, path)
@@ -1,54 +1,215 @@
+import sys
 import json
 import pandas as pd
-import spacy
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.decomposition import LatentDirichletAllocation
-from collections import Counter
-from transformers import pipeline
+from collections import Counter, deque
 import re
-from sklearn.feature_extraction.text import CountVectorizer, ENGLISH_STOP_WORDS
 import os
+import time
 import datetime
+import importlib.util
 import numpy as np
+from result_cache import ResultCache
+from result_writer import open_result_writer, prune_results
+from model_registry import CONFIG, configure, get_sentiment_pipeline, get_nlp, resolved_sentiment_revision
+from aspect_terms import TermVocabulary, extract_aspects, term_counts
 
-analyseur = pipeline(
-    task= "sentiment-analysis",
-    model= "nlptown/bert-base-multilingual-uncased-sentiment", 
-    device= 0                     # Utilise le GPU si disponible (mettre -1 pour CPU)
-    )
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+from run_metrics import get_run, finish_run, peak_rss_bytes
+from review_spool import ReviewSpool
+
+# Les modèles (transformers, spaCy, sklearn) sont chargés au premier usage via
+# model_registry : importer ce module reste rapide, même sans GPU.
+
+# Inférence par lots : nombre de textes par appel au modèle et longueur max en tokens
+SENTIMENT_BATCH_SIZE = 32
+SENTIMENT_MAX_LENGTH = 512
+
+# Inférence répartie sur plusieurs processus CPU (1 = dans le processus courant),
+# par paquets de SENTIMENT_SHARD_SIZE textes
+TRANSFORM_WORKERS = int(os.environ.get("CIH_TRANSFORM_WORKERS", "1"))
+SENTIMENT_SHARD_SIZE = 1000
+
+# Modèle de topics du corpus, persisté entre deux exécutions
+TOPIC_MODEL_PATH = "~/airflow/reviews_DB_source/topic_model.joblib"
+N_TOPICS = 10
+
+# Aspects (groupes nominaux lemmatisés par spaCy), stockés en identifiants de termes
+ASPECTS_ENABLED = os.environ.get("CIH_ASPECTS", "1") == "1"
+ASPECT_VOCAB_PATH = "~/airflow/reviews_DB_source/aspect_terms.json"
+ASPECT_BATCH_SIZE = 256
+ASPECT_PROCESSES = int(os.environ.get("CIH_ASPECT_PROCESSES", "1"))
+
+# Cache disque des résultats : seuls les nouveaux avis passent par les modèles
+CACHE_PATH = "~/airflow/reviews_DB_source/nlp_cache.sqlite"
+CACHE_MAX_ENTRIES = 500000
+
+# Lecture en flux du fichier de scraping
+SOURCE_PATH = "~/airflow/reviews_DB_source/resultats_cih_banque_final.json"
+REVIEW_COLUMNS = ["place_address", "user_name", "text", "date", "city", "scraped_at"]
+REVIEW_CHUNK_SIZE = 5000
+READ_BUFFER_SIZE = 1 << 16
+
+# Schéma en mémoire des avis : adresses et villes (une centaine de valeurs) en
+# catégories, textes en chaînes Arrow, probabilités en float32, topic en entier
+SENTIMENT_LABELS = ["NEGATIVE", "NEUTRAL", "POSITIVE", "neutral"]   # "neutral" : textes vides
+STRING_DTYPE = pd.StringDtype("pyarrow" if importlib.util.find_spec("pyarrow") else "python")
+REVIEW_SCHEMA = {
+    "place_address": "category",
+    "city": "category",
+    "user_name": STRING_DTYPE,
+    "text": STRING_DTYPE,
+    "sentiment": pd.CategoricalDtype(SENTIMENT_LABELS),
+    "sentiment_proba": "float32",
+    "topic_id": "Int16",
+    "topic_version": STRING_DTYPE,
+}
+
+# Dates relatives de Google ("3 weeks ago", "il y a un an", "Edited a month ago") :
+# nombre (ou article) et unité, convertis en durée approximative
+RELATIVE_DATE_PATTERN = (
+    r"(?i)(?P<amount>\d+|an?|one|une?)\s+"
+    r"(?P<unit>second|minute|hour|day|week|month|year|seconde|heure|jour|semaine|mois|ans?|année)"
+)
+RELATIVE_DATE_UNITS = {
+    "second": pd.Timedelta(seconds= 1), "seconde": pd.Timedelta(seconds= 1),
+    "minute": pd.Timedelta(minutes= 1),
+    "hour": pd.Timedelta(hours= 1), "heure": pd.Timedelta(hours= 1),
+    "day": pd.Timedelta(days= 1), "jour": pd.Timedelta(days= 1),
+    "week": pd.Timedelta(weeks= 1), "semaine": pd.Timedelta(weeks= 1),
+    "month": pd.Timedelta(days= 30), "mois": pd.Timedelta(days= 30),
+    "year": pd.Timedelta(days= 365), "an": pd.Timedelta(days= 365), "ans": pd.Timedelta(days= 365),
+    "année": pd.Timedelta(days= 365),
+}
+
+# Résultats : Parquet si pyarrow est disponible, NDJSON sinon ("auto", "parquet", "ndjson")
+RESULTS_PATH = "~/airflow/reviews_DB_source/CIH_analysis_results"
+RESULTS_FORMAT = os.environ.get("CIH_RESULTS_FORMAT", "auto")
+# Un fichier par exécution (<RESULTS_PATH>_<horodatage>), les RESULTS_KEEP derniers sont gardés
+RESULTS_KEEP = 5
+
+
+def apply_review_schema(df, columns= None):
+    """Convertit sur place les colonnes connues vers les types de REVIEW_SCHEMA."""
+    for column in columns or list(df.columns):
+        dtype = REVIEW_SCHEMA.get(column)
+        if dtype is not None and column in df and df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+    return df
+
+def iter_places(file_path):
+    """Parcourt les agences d'un fichier de scraping sans le charger en entier.
+
+    Accepte le tableau JSON écrit par le scraper ou une variante NDJSON
+    (une agence par ligne).
+    """
+    with open(os.path.expanduser(file_path), encoding= "utf-8") as f:
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        if head == "[":
+            yield from _iter_json_array(f)
+            return
+        # NDJSON : une agence par ligne
+        first_line = head + f.readline()
+        if first_line.strip():
+            yield json.loads(first_line)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def _iter_json_array(f, read_size= READ_BUFFER_SIZE):
+    """Décode un à un les éléments d'un tableau JSON, le '[' initial étant déjà lu."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    size = read_size
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            data = f.read(size)
+            if not data:
+                if buffer.strip():
+                    raise ValueError("Fichier JSON tronqué")
+                return
+            buffer += data
+            # Objet plus grand que le tampon : lectures de plus en plus grandes
+            size *= 2
+            continue
+        yield item
+        buffer = buffer[end:]
+        size = read_size
+
+def flatten_place(place):
+    """Aplatit une agence {place_details, reviews} en une ligne par avis."""
+    address = (place.get("place_details") or {}).get("address")
+    scraped_at = place.get("scraped_at")
+    for review in place.get("reviews") or []:
+        place_address = review.get("place_address", address)
+        city = review.get("city")
+        if city is None and isinstance(place_address, str):
+            city = extract_city_from_address(place_address)
+        yield {
+            "place_address": place_address,
+            "user_name": review.get("user_name"),
+            "text": review.get("text"),
+            "date": review.get("date"),
+            "city": city,
+            "scraped_at": review.get("scraped_at", scraped_at)
+        }
+
+def iter_review_chunks(file_path, chunk_size= REVIEW_CHUNK_SIZE):
+    """Lit les avis par blocs d'au plus chunk_size lignes.
+
+    La mémoire utilisée reste bornée par la taille d'un bloc (et de l'agence
+    en cours de lecture), quel que soit le nombre d'agences.
+
+    Yields:
+        pd.DataFrame: colonnes REVIEW_COLUMNS typées selon REVIEW_SCHEMA,
+        index continu d'un bloc à l'autre
+    """
+    return iter_place_chunks(iter_places(file_path), chunk_size)
 
+def iter_place_chunks(places, chunk_size= REVIEW_CHUNK_SIZE):
+    """Regroupe les avis d'une suite d'agences en blocs d'au plus chunk_size lignes.
 
-# Load SpaCy model
-nlp = spacy.load('en_core_web_sm')
+    Un None dans places (file d'attente momentanément vide, voir
+    ReviewSpool.consume) envoie tout de suite le bloc en cours.
+    """
+    rows = []
+    start = 0
+    for place in places:
+        if place is not None:
+            rows.extend(flatten_place(place))
+        # Blocs pleins, puis le reste si la file est momentanément vide
+        while len(rows) >= chunk_size or (rows and place is None):
+            block, rows = rows[:chunk_size], rows[chunk_size:]
+            yield _review_frame(block, start)
+            start += len(block)
+    if rows:
+        yield _review_frame(rows, start)
+
+def _review_frame(rows, start):
+    df = pd.DataFrame(rows, columns= REVIEW_COLUMNS, index= pd.RangeIndex(start, start + len(rows)))
+    return apply_review_schema(df)
 
 def load_reviews(file_path):
     """
     Load review data from JSON file
+    Charge tous les avis en mémoire en un seul DataFrame (concaténation des
+    blocs) : pour un gros fichier, parcourir iter_review_chunks(), comme le
+    transformer, garde la mémoire bornée par bloc.
     : return: 
         data frame;
             contain place adress, hashed user name, review and review publication date
     """
-    
-    df = pd.read_json(file_path, orient= "records")
-    df_reviews = pd.json_normalize(
-    df.to_dict(orient="records"),
-    record_path="reviews",
-    meta=[["place_details", "address"]],
-    meta_prefix="place_"
-    )
-    
-    # Sélection des colonnes voulues et renommage
-    df_final = df_reviews[[
-        "place_address",  # contenu de place_details.address
-        "user_name",      # a encode
-        "text",
-        "date",
-        "city"
-    ]].rename(columns={"place_address": "place_address"})
-    
-    
-    df_final.drop(columns= ["user_name"])
-    return df_final
+    chunks = list(iter_review_chunks(file_path))
+    if not chunks:
+        return apply_review_schema(pd.DataFrame(columns= REVIEW_COLUMNS))
+    # Les catégories diffèrent d'un bloc à l'autre : retypage après concaténation
+    return apply_review_schema(pd.concat(chunks))
 
 def extract_city_from_address(address):
         """Extrait la ville à partir de l'adresse en prenant ce qui suit la dernière virgule."""
@@ -66,7 +227,7 @@ def preprocess_text(text):
     return text
 
 def analyze_sentiment(text):
-    """Analyze sentiment of text using NLTK's VADER"""
+    """Analyze sentiment of text with the Hugging Face model (1 to 5 stars), one text at a time"""
     
     # Skip empty or non-string texts
     if not text or not isinstance(text, str):
@@ -75,7 +236,7 @@ def analyze_sentiment(text):
             'score' : 1
         }
     
-    resultat = analyseur(text)
+    resultat = get_sentiment_pipeline()(text)
     if resultat[0]["label"] == "3 stars":
         sentiment = "NEUTRAL"
     elif resultat[0]["label"] < "3 stars":
@@ -86,140 +247,477 @@ def analyze_sentiment(text):
         "sentiment" : sentiment,
         "score": resultat[0]["score"]
     }
-    
 
-    
-def extract_topics(text):
-    
+def stars_to_sentiment(labels):
+    """Convertit les labels du modèle ("1 star" ... "5 stars") en sentiment, de façon vectorisée."""
+    stars = pd.Series(labels, dtype="object").str.extract(r"(\d)", expand=False).astype(float)
+    return pd.Series(
+        np.select([stars < 3, stars == 3], ["NEGATIVE", "NEUTRAL"], default="POSITIVE"),
+        index=stars.index
+    )
+
+def analyze_sentiment_batch(texts, batch_size=SENTIMENT_BATCH_SIZE, max_length=SENTIMENT_MAX_LENGTH):
+    """Analyse le sentiment d'une colonne de textes en lots.
+
+    Les textes sont triés par longueur (en caractères, sans tokenisation
+    préalable) pour limiter le padding dans chaque lot, les textes vides ne
+    passent pas par le modèle.
+
+    Args:
+        texts (pd.Series): textes des avis
+        batch_size (int): nombre de textes par lot envoyé au modèle
+        max_length (int): longueur maximale (en tokens) avant troncature
+
+    Returns:
+        pd.DataFrame: colonnes "sentiment" et "score", même index que texts
     """
-    Extrait des topics (sujets) à partir d'une liste de textes français en utilisant LDA.
+    texts = pd.Series(texts)
+    result = pd.DataFrame({"sentiment": "neutral", "score": 1.0}, index=texts.index)
+
+    # Ignorer les textes vides ou non textuels, comme analyze_sentiment
+    valid = texts.map(lambda t: isinstance(t, str) and bool(t))
+    to_score = texts[valid]
+    if to_score.empty:
+        return result
+
+    analyseur = get_sentiment_pipeline()
 
-    Paramètres :
-    - texts: list de str, les documents à analyser
-    - num_topics: int, nombre de topics à extraire
-    - num_words: int, nombre de mots à afficher par topic
+    # Tri par longueur : les lots regroupent des textes de taille voisine. La longueur
+    # en caractères suit celle en tokens sans tokeniser deux fois (ici et dans la pipeline)
+    order = np.argsort(to_score.str.len().to_numpy(), kind="stable")
+    sorted_texts = to_score.iloc[order]
 
-    Retourne :
-    - topics: dict où chaque clé est un 'Sujet i' et chaque valeur la liste des top mots
+    predictions = analyseur(
+        sorted_texts.tolist(),
+        batch_size=batch_size,
+        truncation=True,
+        max_length=max_length
+    )
+
+    labels = [p["label"] for p in predictions]
+    result.loc[sorted_texts.index, "sentiment"] = stars_to_sentiment(labels).to_numpy()
+    result.loc[sorted_texts.index, "score"] = [p["score"] for p in predictions]
+    return result
+
+def cache_lookup(texts, cache, model_name, model_version):
+    """Recherche des textes dans le cache.
+
+    Returns:
+        (pd.Series, dict, pd.Series): clé de chaque texte, résultats trouvés,
+        textes normalisés à calculer (un seul par clé manquante)
     """
-    if not text or not isinstance(text, str):
-        return None
-    
-    # Liste basique de stop-words français
-    
-    
-    text = [text+ "no_topic"]
-    num_words= max(([len(text) for text in text]))
-    # 1. Vectorisation
-    stop_words = list(ENGLISH_STOP_WORDS)
-    vectorizer = CountVectorizer(stop_words= stop_words)
-    dt_matrix = vectorizer.fit_transform(text)
-    
-    # 2. Modèle LDA
-    lda = LatentDirichletAllocation(n_components= 1, random_state=0)
-    lda.fit(dt_matrix)
-    
-    # 3. Extraction des mots-clés par topic
-    terms = vectorizer.get_feature_names_out()
-    topics = {}
-    for idx, comp in enumerate(lda.components_):
-        top_indices = comp.argsort()[:-num_words-1:-1]
-        topics[f"Sujet {idx+1}"] = [terms[i] for i in top_indices]
+    normalized = texts.map(preprocess_text)
+    keys = normalized.map(lambda t: cache.make_key(t, model_name, model_version))
+
+    cache.check_model(model_name, model_version)
+    found = cache.get_many(keys.unique().tolist())
 
-    return topics
+    # Un seul passage par le modèle pour chaque texte manquant, même répété
+    missing = keys[~keys.isin(list(found))].drop_duplicates()
+    return keys, found, normalized[missing.index]
 
-def analyze_reviews(df, inplace= False):
+def cache_fill(keys, found, to_score, scored, cache, model_name):
+    """Enregistre les nouveaux résultats et reconstitue les résultats de tous les textes.
+
+    Returns:
+        pd.DataFrame: résultats pour tous les textes, même index que keys
+    """
+    computed = {}
+    if not to_score.empty:
+        computed = dict(zip(keys[to_score.index], scored.loc[to_score.index].to_dict(orient= "records")))
+        cache.put_many(model_name, computed)
+
+    values = keys.map(lambda k: found[k] if k in found else computed[k])
+    return pd.DataFrame(values.tolist(), index= keys.index)
+
+def cached_apply(texts, score_fn, cache, model_name, model_version):
+    """Applique score_fn uniquement aux textes absents du cache.
+
+    Args:
+        texts (pd.Series): textes bruts des avis
+        score_fn (callable): pd.Series de textes -> pd.DataFrame de résultats (même index)
+        cache (ResultCache): cache des résultats
+        model_name (str), model_version (str): identifient le modèle dans la clé du cache
+
+    Returns:
+        pd.DataFrame: résultats pour tous les textes, même index que texts
+    """
+    keys, found, to_score = cache_lookup(texts, cache, model_name, model_version)
+    scored = score_fn(to_score) if not to_score.empty else None
+    return cache_fill(keys, found, to_score, scored, cache, model_name)
+
+def analyze_reviews(df, inplace= False, batch_size= SENTIMENT_BATCH_SIZE, max_length= SENTIMENT_MAX_LENGTH, cache= None):
     """Analyze reviws reviews column
 
     Args:
         df (pd.DataFrame): data contains "text", "user_enc" ...
         inplace (bool, optional): modify df if True. Defaults to False.
+        batch_size (int, optional): number of texts per model call. Defaults to SENTIMENT_BATCH_SIZE.
+        max_length (int, optional): max tokens per text before truncation. Defaults to SENTIMENT_MAX_LENGTH.
+        cache (ResultCache, optional): only reviews missing from the cache are sent to the model.
 
     Returns:
         void : if inplace is True
         pd.DataFrame if inplace is False
     """
     
-    sentiments_df = df["text"] \
-    .apply(lambda t: pd.Series(analyze_sentiment(t))) \
-    .rename(columns={"score": "sentiment_proba"})
+    score_fn = lambda texts: analyze_sentiment_batch(texts, batch_size=batch_size, max_length=max_length)
+    with get_run("transform").stage("sentiment", items= len(df)):
+        if cache is None:
+            sentiments_df = score_fn(df["text"])
+        else:
+            sentiments_df = cached_apply(
+                df["text"], score_fn, cache, CONFIG["sentiment_model"], _sentiment_cache_version(max_length)
+            )
+    if not inplace:
+        # Copie superficielle : les colonnes existantes ne sont pas dupliquées
+        df = df.copy(deep= False)
+    _set_sentiment(df, sentiments_df)
+    if not inplace:
+        return df
+
+def _set_sentiment(df, scored):
+    """Ajoute à df les colonnes "sentiment" et "sentiment_proba" typées, depuis les résultats du modèle."""
+    df["sentiment"] = scored["sentiment"]
+    df["sentiment_proba"] = scored["score"]
+    apply_review_schema(df, ["sentiment", "sentiment_proba"])
+
+def _sentiment_cache_version(max_length):
+    # Les moteurs int8 / onnx ne donnent pas exactement les mêmes scores : entrées de cache séparées
+    backend = CONFIG["sentiment_backend"]
+    suffix = "" if backend == "torch" else f"/{backend}"
+    return f"{resolved_sentiment_revision()}/len{max_length}{suffix}"
+
+def _init_sentiment_worker(config, torch_threads):
+    """Initialisation d'un processus d'inférence : threads torch limités, modèle chargé une seule fois."""
+    os.environ["OMP_NUM_THREADS"] = str(torch_threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    configure(**dict(config, device= "cpu", torch_threads= torch_threads))
+    get_sentiment_pipeline()
+
+def _score_shard(texts, batch_size, max_length):
+    return analyze_sentiment_batch(texts, batch_size= batch_size, max_length= max_length)
+
+def iter_analyzed_chunks(chunks, cache= None, n_workers= TRANSFORM_WORKERS, batch_size= SENTIMENT_BATCH_SIZE,
+                         max_length= SENTIMENT_MAX_LENGTH, lookahead= 2):
+    """Ajoute "sentiment" et "sentiment_proba" à chaque bloc d'avis, dans l'ordre de lecture.
+
+    Avec n_workers > 1, les textes absents du cache sont découpés en paquets de
+    SENTIMENT_SHARD_SIZE et scorés par un pool de processus : chaque processus
+    charge le modèle une fois et limite torch à cpu_count // n_workers threads.
+    Jusqu'à lookahead blocs sont préparés d'avance pour occuper tous les
+    processus ; le cache n'est lu et écrit que par le processus principal.
+
+    Args:
+        chunks (iterable): blocs d'avis (pd.DataFrame avec une colonne "text")
+        cache (ResultCache, optional): seuls les avis absents du cache sont scorés
+
+    Yields:
+        pd.DataFrame: chaque bloc, complété sur place
+    """
+    if n_workers <= 1:
+        for chunk in chunks:
+            analyze_reviews(chunk, inplace= True, batch_size= batch_size, max_length= max_length, cache= cache)
+            yield chunk
+        return
+
+    import multiprocessing as mp
+
+    model_name = CONFIG["sentiment_model"]
+    model_version = _sentiment_cache_version(max_length)
+    metrics = get_run("transform")
+    torch_threads = max(1, (os.cpu_count() or 1) // n_workers)
+    pending = deque()
+
+    with mp.get_context("spawn").Pool(
+        n_workers, initializer= _init_sentiment_worker, initargs= (dict(CONFIG, sentiment_revision= resolved_sentiment_revision()), torch_threads)
+    ) as pool:
+
+        def submit(chunk):
+            start = time.perf_counter()
+            if cache is None:
+                keys = found = None
+                to_score = chunk["text"]
+            else:
+                keys, found, to_score = cache_lookup(chunk["text"], cache, model_name, model_version)
+            shards = [
+                pool.apply_async(_score_shard, (to_score.iloc[i:i + SENTIMENT_SHARD_SIZE], batch_size, max_length))
+                for i in range(0, len(to_score), SENTIMENT_SHARD_SIZE)
+            ]
+            pending.append((chunk, keys, found, to_score, shards, time.perf_counter() - start))
+
+        def collect():
+            chunk, keys, found, to_score, shards, elapsed = pending.popleft()
+            start = time.perf_counter()
+            parts = [shard.get() for shard in shards]
+            scored = pd.concat(parts) if parts else pd.DataFrame(columns= ["sentiment", "score"])
+            if cache is not None:
+                scored = cache_fill(keys, found, to_score, scored, cache, model_name)
+            _set_sentiment(chunk, scored)
+            # Temps d'attente de ce processus (le calcul des workers se recouvre)
+            metrics.get_stage("sentiment").observe(elapsed + time.perf_counter() - start, len(chunk))
+            return chunk
+
+        for chunk in chunks:
+            submit(chunk)
+            if len(pending) > lookahead:
+                yield collect()
+        while pending:
+            yield collect()
+
+def topic_analysis(df, inplace= False, model= None, update= True, model_path= TOPIC_MODEL_PATH):
+    """Assigne à chaque avis son topic dominant, à partir d'un LDA ajusté sur tout le corpus.
+
+    Args:
+        df (pd.DataFrame): data contains "text"
+        inplace (bool, optional): add "topic_id" and "topic_version" (fit_id of the model that
+            assigned it) columns to df if True. Defaults to False.
+        model (CorpusTopicModel, optional): fitted model; loaded from model_path if None.
+        update (bool, optional): refine the model with these reviews (partial_fit) and save it. Defaults to True.
+        model_path (str, optional): where the fitted vectorizer and LDA are persisted; None to skip saving.
+
+    Returns:
+        void : if inplace is True
+        pd.Series if inplace is False: id i of the dominant topic (label "Sujet i" in
+        CorpusTopicModel.topic_words, for the model version model.fit_id), <NA> for empty texts
+    """
+    # Import différé : sklearn n'est chargé que si l'analyse des topics est lancée
+    from topic_model import CorpusTopicModel
+
+    if model is None:
+        model = CorpusTopicModel.load(model_path) or CorpusTopicModel(n_topics= N_TOPICS)
+
+    with get_run("transform").stage("topics", items= len(df)):
+        topic_ids = _assign_topics(df, model, update, model_path)
 
-    # On concatène côte à côte
-    df_final = pd.concat([df, sentiments_df], axis=1)
-    
     if inplace:
-        df= df_final
+        df["topic_id"]= topic_ids
+        df["topic_version"]= pd.Series(model.fit_id, index= df.index, dtype= REVIEW_SCHEMA["topic_version"]).where(topic_ids.notna())
         return
-    return df_final
+    return topic_ids
+
+def _assign_topics(df, model, update, model_path):
+    texts = df["text"]
+    valid = texts.map(lambda t: isinstance(t, str) and bool(t))
+
+    if update and valid.any():
+        model.partial_fit(texts[valid])
+        if model_path:
+            model.save(model_path)
+
+    topic_ids = pd.Series(pd.NA, index= df.index, dtype= REVIEW_SCHEMA["topic_id"], name= "topic_id")
+    if valid.any() and model.is_fitted:
+        # Pas de cache : le modèle change à chaque lot (partial_fit), une assignation ne serait jamais réutilisée.
+        # Une seule transformation creuse pour tous les avis du lot ; ids à partir de 1 comme "Sujet i"
+        dominant, _ = model.dominant_topics(texts[valid])
+        topic_ids[valid] = pd.Series(dominant + 1, index= texts[valid].index).astype(REVIEW_SCHEMA["topic_id"])
+    return topic_ids
+
+def aspect_analysis(df, vocab, inplace= False, batch_size= ASPECT_BATCH_SIZE, n_process= ASPECT_PROCESSES, cache= None):
+    """Extrait les aspects de chaque avis (groupes nominaux lemmatisés) avec nlp.pipe.
+
+    Args:
+        df (pd.DataFrame): data contains "text"
+        vocab (TermVocabulary): terms are interned into it
+        inplace (bool, optional): add an "aspect_ids" column to df if True. Defaults to False.
+        cache (ResultCache, optional): reuse the terms extracted with the same spaCy model.
+
+    Returns:
+        void : if inplace is True
+        pd.Series if inplace is False: int32 array of term ids per review (see vocab.terms)
+    """
+    nlp = get_nlp()
+    texts = df["text"]
+    valid = texts.map(lambda t: isinstance(t, str) and bool(t))
+
+    def extract(batch):
+        terms = extract_aspects(nlp, batch.tolist(), batch_size= batch_size, n_process= n_process)
+        return pd.DataFrame({"aspects": terms}, index= batch.index)
+
+    empty = np.empty(0, dtype= np.int32)
+    with get_run("transform").stage("aspects", items= len(df)):
+        encoded = {}
+        if valid.any():
+            if cache is None:
+                extracted = extract(texts[valid])
+            else:
+                version = f"{nlp.meta.get('version')}/{'+'.join(nlp.pipe_names)}"
+                extracted = cached_apply(texts[valid], extract, cache, f"aspects-{CONFIG['spacy_model']}", version)
+            encoded = dict(zip(extracted.index, extracted["aspects"].map(vocab.encode)))
+        aspect_ids = pd.Series([encoded.get(i, empty) for i in df.index], index= df.index, name= "aspect_ids", dtype= object)
 
-def topic_analysis(df, inplace= False):
-    
-    # On applique analyze_sentiment sur chaque texte, on récupère un Series pour chaque dict
-    topics_df = df["text"]\
-        .apply(lambda t: pd.Series(extract_topics(t)))
     if inplace:
-        df["topics"]= topics_df
+        df["aspect_ids"] = aspect_ids
         return
-    return topics_df
+    return aspect_ids
+
+# Durée correspondant à chaque chaîne de date déjà rencontrée (quelques dizaines au plus)
+_relative_date_cache = {}
+
+def relative_date_offsets(dates):
+    """Durée écoulée pour chaque date relative, NaT si la chaîne n'est pas reconnue.
+
+    Seules les chaînes jamais vues sont analysées (str.extract), puis les
+    durées sont reportées sur toute la colonne.
+    """
+    codes, uniques = pd.factorize(pd.Series(dates, dtype= "object"))
+    unknown = [u for u in uniques if u not in _relative_date_cache]
+    if unknown:
+        parts = pd.Series(unknown, dtype= "object").str.extract(RELATIVE_DATE_PATTERN)
+        amounts = pd.to_numeric(
+            parts["amount"].str.lower().replace({"a": "1", "an": "1", "one": "1", "un": "1", "une": "1"}),
+            errors= "coerce"
+        )
+        units = pd.to_timedelta(parts["unit"].str.lower().map(RELATIVE_DATE_UNITS))
+        _relative_date_cache.update(zip(unknown, units * amounts))
+
+    # Code -1 : valeur manquante (None / NaN)
+    offsets = pd.TimedeltaIndex([_relative_date_cache[u] for u in uniques] + [pd.NaT])
+    return pd.Series(offsets[codes], index= getattr(dates, "index", None))
+
+def parse_relative_dates(dates, scraped_at= None):
+    """Convertit les dates relatives de Google en dates approximatives (jour).
+
+    Args:
+        dates (pd.Series): "a day ago", "3 weeks ago", "2 years ago"...
+        scraped_at (pd.Series | str | datetime, optional): heure du scraping de
+            chaque avis (ou commune à tous) ; maintenant par défaut
+
+    Returns:
+        pd.Series: datetime64, NaT pour les dates non reconnues
+    """
+    dates = pd.Series(dates)
+    offsets = relative_date_offsets(dates)
+    if scraped_at is None:
+        scraped_at = pd.Timestamp.now()
+    if isinstance(scraped_at, pd.Series):
+        reference = pd.to_datetime(scraped_at, errors= "coerce").fillna(pd.Timestamp.now())
+    else:
+        reference = pd.Timestamp(scraped_at)
+    return (reference - offsets).dt.normalize()
 
 def date_tranformer(date):
     """Transforme date to number of years ago
     : params: 
         date (str): Combien de temp a passe sur la publication / dernière modification de l'avis
     : retuns:
-        nombre d'années passe sur la publication / dernière modification
+        année approximative de publication / dernière modification, None si non reconnue
     """
-    
-    year_ago = None
-    
-    if "month" in date:
-        year_ago = datetime.date.today().year
-        
-    if "year" in date:
-        try:
-            year_ago =datetime.date.today().year - int(date[:2])
-        except:
-            year_ago = datetime.date.today().year - 1
-    return year_ago
+    parsed = parse_relative_dates(pd.Series([date], dtype= "object")).iloc[0]
+    return None if pd.isna(parsed) else parsed.year
         
 
 
-def transformer():
-    # File path to your JSON data - replace with actual df_final
-    file_path = '~/airflow/reviews_DB_source/resultats_cih_banque_final.json'
-    
-    # Load review data
-    reviews_data = load_reviews(file_path)
-    
-    if reviews_data.empty:
+def transformer(file_path= SOURCE_PATH, chunk_size= REVIEW_CHUNK_SIZE, output_format= RESULTS_FORMAT,
+                n_workers= TRANSFORM_WORKERS, spool_dir= None, aspects= ASPECTS_ENABLED, run_id= None):
+    """Analyse les avis bloc par bloc : la mémoire reste stable quel que soit le volume scrapé.
+
+    n_workers > 1 répartit l'analyse de sentiment sur un pool de processus ;
+    topics, dates et écriture restent dans ce processus, dans l'ordre des blocs.
+    spool_dir: lit les agences au fil du scraping (ReviewSpool) au lieu du
+    fichier final ; le transform se termine avec le scraping (celui de run_id
+    si donné, à passer aussi au scraping).
+    aspects: ajoute les aspects de chaque avis (aspect_ids, termes dans les métadonnées).
+
+    Returns:
+        dict: référence du fichier de résultats (path, format, rows, sha256),
+        poussée dans XCom à la place des données ; None si aucun avis
+    """
+    from topic_model import CorpusTopicModel
+
+    cache = ResultCache(CACHE_PATH, max_entries= CACHE_MAX_ENTRIES)
+    topic_model = CorpusTopicModel.load(TOPIC_MODEL_PATH) or CorpusTopicModel(n_topics= N_TOPICS)
+    # Mots des topics de chaque version du modèle utilisée pendant l'exécution
+    topic_versions = {}
+    vocab = TermVocabulary.load(ASPECT_VOCAB_PATH) if aspects else None
+    aspect_counts = Counter()  # mentions par identifiant de terme
+
+    spool = ReviewSpool(spool_dir, run_id= run_id) if spool_dir else None
+    source = spool.folder if spool else os.path.expanduser(file_path)
+    run_stamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+    writer = open_result_writer(f"{RESULTS_PATH}_{run_stamp}", output_format, metadata= {
+        "source": source,
+        "sentiment_model": CONFIG["sentiment_model"],
+        "sentiment_revision": CONFIG["sentiment_revision"],
+        "sentiment_commit": resolved_sentiment_revision(),
+        "sentiment_backend": CONFIG["sentiment_backend"],
+        "n_topics": topic_model.n_topics
+    })
+    n_chunks = 0
+    n_reviews = 0
+    metrics = get_run("transform")
+    run_start = time.perf_counter()
+    # Anciens fichiers sans heure de scraping : date de dernière modification du fichier
+    file_time = pd.Timestamp(datetime.datetime.fromtimestamp(os.path.getmtime(source))) if not spool else pd.Timestamp.now()
+
+    with writer:
+        if spool is not None:
+            chunks = iter_place_chunks(spool.consume(), chunk_size)
+        else:
+            chunks = iter_review_chunks(file_path, chunk_size)
+        # Analyze reviews (sentiment, éventuellement réparti sur plusieurs processus)
+        for reviews_data in iter_analyzed_chunks(chunks, cache= cache, n_workers= n_workers):
+            # Extraire les sujets (mise à jour en ligne du modèle du corpus)
+            topic_analysis(reviews_data, inplace= True, model= topic_model, model_path= None)
+            if topic_model.is_fitted:
+                topic_versions[topic_model.fit_id] = topic_model.topic_words()
+
+            # Aspects des avis (identifiants de termes)
+            if vocab is not None:
+                aspect_analysis(reviews_data, vocab, inplace= True, cache= cache)
+                aspect_counts.update(term_counts(reviews_data["aspect_ids"]))
+
+            # Dates relatives -> dates approximatives, par rapport à l'heure du scraping
+            with metrics.stage("dates", items= len(reviews_data)):
+                scraped_at = pd.to_datetime(reviews_data["scraped_at"], errors= "coerce").fillna(file_time)
+                reviews_data["date"] = parse_relative_dates(reviews_data["date"], scraped_at)
+
+            if n_chunks == 0:
+                print("\n===== SAMPLE ANALYSIS RESULTS =====")
+                print(reviews_data.sample(min(5, len(reviews_data))))
+
+            # Save detailed results
+            with metrics.stage("write", items= len(reviews_data)):
+                writer.write(reviews_data)
+
+            n_chunks += 1
+            n_reviews += int((reviews_data["text"] != "").sum())
+            print(f"Bloc {n_chunks}: {len(reviews_data)} avis traités")
+
+        writer.metadata["topic_model_version"] = topic_model.version
+        # Mots des topics, une seule fois pour tout le fichier (les avis ne portent que topic_id et
+        # topic_version) ; un réajustement pendant l'exécution donne une seconde version
+        if topic_model.is_fitted:
+            writer.metadata["topic_words"] = topic_model.topic_words()
+            writer.metadata["topic_versions"] = topic_versions
+        if vocab is not None:
+            writer.metadata["aspect_terms"] = vocab.terms
+
+    if spool is not None:
+        # Résultats écrits : les agences lues peuvent quitter la file
+        spool.commit()
+
+    cache_stats = cache.stats()
+    cache.close()
+    metrics.get_stage("transform").observe(time.perf_counter() - run_start, n_reviews, peak_rss= peak_rss_bytes())
+    finish_run("transform")
+
+    if n_chunks == 0:
         print("No data to analyze. Please check the file.")
         return
-    
-    # Analyze reviews
-    analyze_reviews(reviews_data, inplace= True)
-    
-    # Extraire les sujets
-    topic_analysis(reviews_data, inplace= True)
-   
-    # Transformer la date
-    reviews_data["date"] = reviews_data["date"].apply(date_tranformer).astype("Int64")
-    
-    # Verify DataFrame
-    l = len(reviews_data)- len(reviews_data[reviews_data["text"] == ""])
-    print(f"\nLoaded {l} reviews for analysis")
-    print("\n===== SAMPLE ANALYSIS RESULTS =====")
-    print(reviews_data.sample(5))
-    
-    
-    
-    # Save detailed results to CSV
-    file_path = os.path.expanduser("~/airflow/reviews_DB_source/CIH_analysis_results.json")
-    with open(file_path, "w", encoding="utf-8") as f:
-        for _, row in reviews_data.iterrows():
-            json.dump(row.to_dict(), f, indent=4, ensure_ascii=False)
-            f.write("\n")  # Separate each record by newline
-    reviews_data.to_csv('~/airflow/reviews_DB_source/CIH_analysis_results.csv', index= False)
-    print(f"\n CIH_analysis_results.json")
+
+    if topic_model.is_fitted:
+        topic_model.save(TOPIC_MODEL_PATH)
+
+    prune_results(RESULTS_PATH, RESULTS_KEEP)
+    if vocab is not None:
+        vocab.save(ASPECT_VOCAB_PATH)
+        print(f"\nAspects les plus cités: {[(vocab.terms[i], n) for i, n in aspect_counts.most_common(15)]}")
+
+    print(f"\nLoaded {n_reviews} reviews for analysis")
+    print(f"\nCache NLP: {cache_stats}")
+    print(f"\n {writer.path}")
+    return writer.reference()
 
 if __name__ == "__main__":
     transformer()
\ No newline at end of file
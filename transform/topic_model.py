@@ -0,0 +1,139 @@
+import os
+import uuid
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer, ENGLISH_STOP_WORDS
+from sklearn.decomposition import LatentDirichletAllocation
+
+
+class CorpusTopicModel:
+    """Modèle de topics LDA ajusté sur l'ensemble du corpus d'avis.
+
+    Un seul vocabulaire et un seul LDA multi-topics sont ajustés sur tous les
+    avis, puis chaque avis reçoit sa distribution de topics via une seule
+    transformation de la matrice creuse document-terme.
+
+    Le vocabulaire est figé une fois le modèle ajusté sur au moins min_fit_docs
+    avis : les mises à jour en ligne (partial_fit) raffinent ensuite les topics
+    avec les nouveaux lots d'avis, les mots inconnus de ces lots sont ignorés.
+    Avant ce seuil, un modèle provisoire est ajusté dès le premier lot (chaque
+    avis reçoit un topic) et les avis reçus sont gardés (corpus, sauvegardé
+    avec le modèle) : le modèle est réajusté sur le corpus accumulé quand il
+    atteint le seuil, un premier lot de quelques avis ne fige pas le vocabulaire.
+
+    Chaque ajustement complet reçoit un nouvel identifiant (fit_id) : les
+    topics "Sujet i" de deux ajustements différents n'ont pas le même sens et
+    sont distingués par leur fit_id (topic_version des résultats).
+    """
+
+    def __init__(self, n_topics=10, num_words=10, max_features=5000, min_df=1, random_state=0, min_fit_docs=1000):
+        self.n_topics = n_topics
+        self.num_words = num_words
+        self.min_fit_docs = min_fit_docs
+        self.corpus = []
+        self.n_fit_docs = 0
+        self.vectorizer = CountVectorizer(
+            stop_words=list(ENGLISH_STOP_WORDS),
+            max_features=max_features,
+            min_df=min_df
+        )
+        self.lda = LatentDirichletAllocation(
+            n_components=n_topics,
+            learning_method="online",
+            random_state=random_state
+        )
+        self.n_updates = 0
+        self.fit_id = None
+
+    @property
+    def is_fitted(self):
+        return self.n_updates > 0
+
+    @property
+    def version(self):
+        """Identifie l'état du modèle : change à chaque fit / partial_fit."""
+        return f"{self.fit_id}.{self.n_updates}"
+
+    def fit(self, texts):
+        """Ajuste le vocabulaire et le LDA sur tout le corpus.
+
+        Sans mot utilisable (mots vides, emoji seuls), le modèle reste non ajusté
+        et sera ajusté sur les lots suivants.
+        """
+        texts = _clean(texts)
+        try:
+            dt_matrix = self.vectorizer.fit_transform(texts)
+        except ValueError:
+            # Vocabulaire vide
+            return self
+        self.lda.fit(dt_matrix)
+        self.n_updates = 1
+        self.fit_id = uuid.uuid4().hex[:12]
+        self.n_fit_docs = len(texts)
+        # Corpus encore trop petit : gardé pour le prochain réajustement
+        self.corpus = texts if len(texts) < self.min_fit_docs else []
+        return self
+
+    def partial_fit(self, texts):
+        """Met à jour le LDA avec un nouveau lot d'avis sans réentraîner depuis zéro.
+
+        Tant que le corpus vu n'atteint pas min_fit_docs avis, le lot est ajouté
+        au corpus accumulé ; le modèle est ajusté sur ce corpus au premier lot
+        (modèle provisoire) puis réajusté une fois le seuil atteint.
+        """
+        if self.n_fit_docs < self.min_fit_docs:
+            self.corpus = self.corpus + _clean(texts)
+            if not self.is_fitted or len(self.corpus) >= self.min_fit_docs:
+                self.fit(self.corpus)
+            return self
+        dt_matrix = self.vectorizer.transform(_clean(texts))
+        if dt_matrix.nnz:
+            self.lda.partial_fit(dt_matrix)
+            self.n_updates += 1
+        return self
+
+    def transform(self, texts):
+        """Distribution des topics pour chaque avis (n_avis x n_topics)."""
+        dt_matrix = self.vectorizer.transform(_clean(texts))
+        return self.lda.transform(dt_matrix)
+
+    def topic_words(self):
+        """Retourne un dict 'Sujet i' -> liste des mots les plus représentatifs."""
+        terms = self.vectorizer.get_feature_names_out()
+        topics = {}
+        for idx, comp in enumerate(self.lda.components_):
+            top_indices = comp.argsort()[:-self.num_words - 1:-1]
+            topics[f"Sujet {idx+1}"] = [terms[i] for i in top_indices]
+        return topics
+
+    def dominant_topics(self, texts):
+        """Indice du topic dominant et sa probabilité pour chaque avis."""
+        doc_topics = self.transform(texts)
+        dominant = doc_topics.argmax(axis=1)
+        return dominant, doc_topics[np.arange(len(dominant)), dominant]
+
+    def save(self, path):
+        """Sauvegarde le vocabulaire et le modèle ajustés."""
+        path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        joblib.dump(self, tmp_path)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path):
+        """Charge un modèle sauvegardé, ou None s'il n'existe pas encore."""
+        path = os.path.expanduser(path)
+        if not os.path.exists(path):
+            return None
+        model = joblib.load(path)
+        # Modèles sauvegardés avant le seuil min_fit_docs : vocabulaire déjà établi
+        model.__dict__.setdefault("min_fit_docs", 0)
+        model.__dict__.setdefault("corpus", [])
+        model.__dict__.setdefault("n_fit_docs", 0)
+        return model
+
+
+def _clean(texts):
+    """Remplace les valeurs manquantes par des chaînes vides."""
+    return [t if isinstance(t, str) else "" for t in texts]